@@ -5,20 +5,41 @@ Power by Lab_Math and CIE - Copyright © 2025
 
 import streamlit as st
 import pandas as pd
-import requests
-import folium
-from streamlit_folium import st_folium
 import hashlib
-import io
-import random
 import os
 
+from services.data_cache import ExcelSnapshotCache
+from services.batch_scoring import report_frame
+from services.dtypes import compact_dtypes, degraded_mask
+from services.geo import assign_coordinates
+from services.image_service import ImageService, paginate
+from services.map_render import render_map_html
+from services.partition_index import PartitionIndex, dataset_version
+from services.perf import recorder as perf, span
+from services.report_view import ReportView
+from services.shards import load_shards
+from services.spatial_index import SpatialIndex, degraded_segments_near_pockets
+
 # ==================== 1. CONFIGURATION ====================
 GITHUB_USER = "Marcialsohfos"
 GITHUB_REPO = "urban_ai_plus"
 GITHUB_BRANCH = "main"
 BASE_URL = f"https://raw.githubusercontent.com/{GITHUB_USER}/{GITHUB_REPO}/{GITHUB_BRANCH}"
 
+# Cache disque des données (URBAN_AI_OFFLINE=1 pour servir le dernier instantané sans réseau)
+DATA_CACHE_DIR = os.environ.get("URBAN_AI_CACHE_DIR", "data/cache")
+OFFLINE_MODE = os.environ.get("URBAN_AI_OFFLINE", "0") == "1"
+# Fichier optionnel de coordonnées réelles (Ville, Nom de la Commune, tronçon de voirie, latitude, longitude)
+GPS_FILE = os.environ.get("URBAN_AI_GPS_FILE", "data/uploads/coordonnees_gps.csv")
+# Manifeste optionnel (chemin ou URL) : un classeur par ville / campagne au lieu du classeur unique
+MANIFEST = os.environ.get("URBAN_AI_MANIFEST")
+
+GALLERY_PAGE_SIZE = 12
+# Au-delà, les points de la carte sont simplifiés sur une grille
+MAP_MAX_POINTS = int(os.environ.get("URBAN_AI_MAP_MAX_POINTS", "2000"))
+# Tronçons programmés affichés (le programme complet est téléchargeable)
+PLAN_PREVIEW_ROWS = 200
+
 MASTER_PASSWORD_HASH = hashlib.sha256("urbankit@1001a".encode()).hexdigest()
 
 st.set_page_config(page_title="URBAN AI | Cameroun", page_icon="🇨🇲", layout="wide")
@@ -26,7 +47,9 @@ st.set_page_config(page_title="URBAN AI | Cameroun", page_icon="🇨🇲", layou
 # ==================== 2. IMPORTATION DU MODÈLE IA ====================
 # On utilise un try/except pour ne pas faire planter l'appli si le dossier models n'est pas encore poussé
 try:
+    from models.maintenance_scheduler import MaintenanceScheduler
     from models.predictive_maintenance import MaintenancePredictor
+    from models.registry import registry as model_registry
     HAS_AI = True
 except ImportError:
     HAS_AI = False
@@ -47,54 +70,96 @@ def check_password():
         return False
     return True
 
-COMMUNE_COORDS = {
-    'Yaounde 1': {'lat': 3.8850, 'lon': 11.5200}, 'Yaounde 2': {'lat': 3.8980, 'lon': 11.5000},
-    'Yaounde 3': {'lat': 3.8400, 'lon': 11.5000}, 'Yaounde 4': {'lat': 3.8450, 'lon': 11.5500},
-    'Yaounde 5': {'lat': 3.8700, 'lon': 11.5400}, 'Yaounde 6': {'lat': 3.8550, 'lon': 11.4800},
-    'Yaounde 7': {'lat': 3.8750, 'lon': 11.4500}, 'Douala 1': {'lat': 4.0500, 'lon': 9.7000},
-    'Douala 2': {'lat': 4.0600, 'lon': 9.7100},   'Douala 3': {'lat': 4.0400, 'lon': 9.7300},
-    'Douala 4': {'lat': 4.0700, 'lon': 9.6600},   'Douala 5': {'lat': 4.0800, 'lon': 9.7500},
-}
-
-def add_simulated_gps(row):
-    commune = str(row.get('Nom de la Commune', '')).strip().title()
-    base = COMMUNE_COORDS.get(commune, {'lat': 3.86, 'lon': 11.52})
-    return pd.Series({
-        'latitude': base['lat'] + random.uniform(-0.02, 0.02),
-        'longitude': base['lon'] + random.uniform(-0.02, 0.02)
-    })
-
 @st.cache_data(ttl=3600)
 def load_data():
-    url = f"{BASE_URL}/data/uploads/indicateurs_urbains.xlsx"
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        with io.BytesIO(response.content) as f:
-            df = pd.read_excel(f)
-        df.columns = df.columns.str.strip()
+        if MANIFEST:
+            # Classeurs chargés en parallèle ; seuls ceux dont le contenu a changé sont re-parsés
+            df = load_shards(MANIFEST, cache_dir=os.path.join(DATA_CACHE_DIR, "shards"), offline=OFFLINE_MODE)
+        else:
+            url = f"{BASE_URL}/data/uploads/indicateurs_urbains.xlsx"
+            # Instantané local : requête conditionnelle, re-parsing seulement si le contenu change
+            cache = ExcelSnapshotCache(url, cache_dir=DATA_CACHE_DIR, offline=OFFLINE_MODE)
+            df = cache.load()
+            # Version du jeu de données = hash du classeur source
+            df.attrs['version'] = cache.read_meta().get('sha256')
         if 'latitude' not in df.columns:
-            gps_data = df.apply(add_simulated_gps, axis=1)
-            df = pd.concat([df, gps_data], axis=1)
+            df = assign_coordinates(df, coords_path=GPS_FILE)
+        # Types compacts : copie plus légère à garder en cache et à sérialiser par session
+        memoire_avant = int(df.memory_usage(deep=True).sum())
+        df = compact_dtypes(df)
+        df.attrs['memoire'] = {'avant': memoire_avant, 'apres': int(df.memory_usage(deep=True).sum())}
         return df
     except Exception as e:
         st.error("Erreur connexion GitHub. Vérifiez que le repo est Public.")
         return pd.DataFrame()
 
+@st.cache_resource(max_entries=2)
+def get_partition_index(version, _df):
+    """Index (Ville, Commune) construit une seule fois par version des données"""
+    return PartitionIndex(_df)
+
 def get_img_url_github(filename, folder):
     if pd.isna(filename) or str(filename).strip() == "": return None
     clean_name = str(filename).strip().replace(" ", "%20")
     return f"{BASE_URL}/data/uploads/{folder}/{clean_name}"
 
+@st.cache_resource
+def get_image_service():
+    """Service d'images partagé (cache disque des originaux et vignettes)"""
+    return ImageService(url_for=get_img_url_github, cache_dir=os.path.join(DATA_CACHE_DIR, "images"), offline=OFFLINE_MODE)
+
+@st.cache_resource(max_entries=8)
+def get_degraded_index(version, ville, _df_v):
+    """KD-tree des tronçons dégradés d'une ville"""
+    return SpatialIndex.from_frame(_df_v, degraded_mask(_df_v))
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_degraded_near_pockets(version, ville, radius_m, _df_v):
+    return degraded_segments_near_pockets(_df_v, radius_m, index=get_degraded_index(version, ville, _df_v))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_commune_map_html(version, ville, commune, _df_c):
+    """Carte d'une commune, construite une fois par version des données"""
+    return render_map_html(_df_c, max_points=MAP_MAX_POINTS)
+
+def gallery_items(df, image_col, caption_col):
+    """Liste (fichier image, légende) des lignes qui ont une image"""
+    if image_col not in df.columns: return []
+    files = df[image_col]
+    captions = df[caption_col] if caption_col in df.columns else pd.Series(None, index=df.index)
+    mask = files.notna() & (files.astype(str).str.strip() != "")
+    return list(zip(files[mask], captions[mask]))
+
+def show_perf_panel(timings):
+    """Durées du rerun courant et percentiles glissants (toutes sessions)"""
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        st.caption("Ce rerun")
+        st.dataframe(pd.DataFrame(timings, columns=["Étape", "ms"]).round(1), hide_index=True, use_container_width=True)
+        st.caption("Toutes sessions (ms)")
+        stats = pd.DataFrame.from_dict(perf.percentiles(), orient='index')
+        st.dataframe(stats.round(1), use_container_width=True)
+
 # ==================== 4. APPLICATION PRINCIPALE ====================
 def main():
     if not check_password(): return
+    # Instrumentation (URBAN_AI_PERF=1) : sans effet mesurable si désactivée
+    perf.start_run()
 
     with st.sidebar:
         st.title("🏙️ URBAN AI")
         st.success("Mode : Connecté")
         if HAS_AI:
             st.info("🧠 Module IA : Actif")
+            # Modèles partagés par toutes les sessions (chargés une fois par processus)
+            for entry in model_registry.stats():
+                if entry['erreur']:
+                    st.caption(f"📦 {os.path.basename(entry['path'])} : illisible")
+                else:
+                    memoire = f"{entry['memory_bytes'] / 1e6:.1f} Mo" if entry['memory_bytes'] is not None else "n/d"
+                    if entry.get('mapped_bytes'):
+                        memoire += f" + {entry['mapped_bytes'] / 1e6:.1f} Mo mappés"
+                    st.caption(f"📦 {os.path.basename(entry['path'])} : {entry['load_time'] * 1000:.0f} ms, {memoire}")
         else:
             st.warning("🧠 Module IA : Non détecté (Vérifiez le dossier models/)")
         
@@ -102,60 +167,77 @@ def main():
             st.session_state.authenticated = False
             st.rerun()
 
-    with st.spinner("Chargement des données..."):
+    with st.spinner("Chargement des données..."), span('chargement'):
         df = load_data()
     if df.empty: st.stop()
+    if 'memoire' in df.attrs:
+        st.sidebar.caption(f"🗄️ Données en cache : {df.attrs['memoire']['apres'] / 1e6:.1f} Mo (au lieu de {df.attrs['memoire']['avant'] / 1e6:.1f} Mo)")
+    if 'shards' in df.attrs:
+        reparses = sum(s['status'] == 'refreshed' for s in df.attrs['shards'])
+        st.sidebar.caption(f"📚 {len(df.attrs['shards'])} classeurs ({reparses} re-parsés au dernier chargement)")
+
+    with span('filtres'):
+        index = get_partition_index(dataset_version(df), df)
 
-    # Filtres
-    col1, col2 = st.columns(2)
-    with col1:
-        villes = sorted(df['Ville'].astype(str).unique())
-        ville_sel = st.selectbox("Ville", villes)
-    with col2:
-        communes = sorted(df[df['Ville'] == ville_sel]['Nom de la Commune'].astype(str).unique())
-        commune_sel = st.selectbox("Commune", communes)
+        # Filtres
+        col1, col2 = st.columns(2)
+        with col1:
+            ville_sel = st.selectbox("Ville", index.villes)
+        with col2:
+            commune_sel = st.selectbox("Commune", index.communes(ville_sel))
 
-    df_c = df[(df['Ville'] == ville_sel) & (df['Nom de la Commune'] == commune_sel)]
+        df_c = index.subset(ville_sel, commune_sel)
+        kpis = index.kpis(ville_sel, commune_sel)
 
     # --- TABS ---
     tab1, tab2, tab3, tab4 = st.tabs(["📊 Tableau de Bord", "📸 Images", "🗺️ Carte", "🧠 Analyse IA"])
 
-    with tab1:
+    with tab1, span('tableau_de_bord'):
         st.header(f"KPIs : {commune_sel}")
         k1, k2, k3, k4 = st.columns(4)
-        k1.metric("Tronçons", len(df_c))
-        k2.metric("Linéaire", f"{df_c['linéaire de voirie(ml)'].sum():,.0f} m")
-        nb_nids = len(df_c[df_c['présence du nid de poule'].notna()])
-        k3.metric("Zones Dégradées", nb_nids, delta_color="inverse")
-        k4.metric("Taudis", f"{df_c['superficie de la poche du quartier de taudis'].sum():,.0f} m²")
+        k1.metric("Tronçons", kpis['troncons'])
+        k2.metric("Linéaire", f"{kpis['lineaire']:,.0f} m")
+        k3.metric("Zones Dégradées", kpis['degrades'], delta_color="inverse")
+        k4.metric("Taudis", f"{kpis['taudis']:,.0f} m²")
         st.dataframe(df_c, use_container_width=True)
 
-    with tab2:
+    with tab2, span('galerie'):
         st.header("Galerie")
+        images = get_image_service()
+        troncons = gallery_items(df_c, 'image_troncon', 'tronçon de voirie')
+        taudis = gallery_items(df_c, 'image_taudis', 'Nom de la poche du quartier de taudis')
+        
+        # Pagination : seules les images de la page affichée sont chargées
+        n_pages = max(paginate(troncons, 1, GALLERY_PAGE_SIZE)[1], paginate(taudis, 1, GALLERY_PAGE_SIZE)[1])
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1) if n_pages > 1 else 1
+        
         c1, c2 = st.columns(2)
-        with c1:
-            st.subheader("Voirie")
-            for _, row in df_c.iterrows():
-                url = get_img_url_github(row.get('image_troncon'), "troncons")
-                if url: st.image(url, caption=row.get('tronçon de voirie'), use_container_width=True)
-        with c2:
-            st.subheader("Taudis")
-            for _, row in df_c.iterrows():
-                url = get_img_url_github(row.get('image_taudis'), "taudis")
-                if url: st.image(url, caption=row.get('Nom de la poche du quartier de taudis'), use_container_width=True)
-
-    with tab3:
+        for col, titre, items, folder in ((c1, "Voirie", troncons, "troncons"), (c2, "Taudis", taudis, "taudis")):
+            with col:
+                st.subheader(titre)
+                visibles, _ = paginate(items, page, GALLERY_PAGE_SIZE)
+                thumbs = images.thumbnails([(filename, folder) for filename, _ in visibles])
+                for path, (_, caption) in zip(thumbs, visibles):
+                    if path: st.image(path, caption=caption, use_container_width=True)
+
+    with tab3, span('carte'):
         st.header("Carte")
         if 'latitude' in df_c.columns:
-            center = [df_c['latitude'].mean(), df_c['longitude'].mean()]
-            m = folium.Map(location=center, zoom_start=13)
-            for _, row in df_c.iterrows():
-                color = 'red' if row.get('présence du nid de poule') == 'Oui' else 'green'
-                folium.Marker([row['latitude'], row['longitude']], popup=row.get('tronçon de voirie'), icon=folium.Icon(color=color)).add_to(m)
-            st_folium(m, width=None, height=500)
+            # Une seule couche GeoJSON / cluster, HTML mis en cache par (commune, version des données)
+            html = get_commune_map_html(index.version, ville_sel, commune_sel, df_c)
+            st.iframe(html, height=500)
+
+            with st.expander("🏚️ Tronçons dégradés près des poches de taudis"):
+                rayon = st.slider("Rayon (m)", min_value=50, max_value=1000, value=200, step=50)
+                # Requête groupée sur toute la ville : un tronçon peut être dans la commune voisine
+                df_v = index.df.iloc[index.ville_rows(ville_sel)]
+                proches = get_degraded_near_pockets(index.version, ville_sel, rayon, df_v)
+                proches = proches[proches['Commune'] == commune_sel]
+                st.caption(f"{proches['poche'].nunique()} poches, {len(proches)} tronçons dégradés à moins de {rayon} m")
+                st.dataframe(proches.drop(columns=['position']), hide_index=True, use_container_width=True)
 
     # --- TAB 4 : INTELLIGENCE ARTIFICIELLE ---
-    with tab4:
+    with tab4, span('analyse_ia'):
         st.header("🤖 Maintenance Prédictive & Recommandations")
         
         if not HAS_AI:
@@ -167,42 +249,61 @@ def main():
             
             st.markdown("Ce module utilise l'IA pour prioriser les interventions en fonction de la dégradation, de l'éclairage et de l'importance de la voirie.")
             
+            # Le rapport est conservé dans la session : changer de page ne relance pas l'analyse
+            cle_rapport = (index.version, predictor.version, ville_sel, commune_sel)
             if st.button("🚀 Lancer l'analyse IA sur la commune"):
-                results = []
+                # Scoring vectorisé de tous les tronçons de la commune en un seul appel
+                # (la mémoire des scores, plus lente que les règles, reste réservée au CLI de batch_scoring)
+                preds = predictor.predict_priority_batch(df_c)
+                # Rapport trié par score de risque, priorité catégorielle (voir report_view)
+                st.session_state.rapport_ia = (cle_rapport, ReportView(report_frame(ville_sel, commune_sel, df_c, preds)))
+            
+            rapport = st.session_state.get('rapport_ia')
+            if rapport is not None and rapport[0] == cle_rapport:
+                _, view = rapport
+                st.subheader("📋 Rapport de Priorisation")
                 
-                # Barre de progression
-                progress_bar = st.progress(0)
+                # Statistiques de l'analyse : une seule agrégation sur la colonne catégorielle
+                effectifs = view.counts()
+                colonnes = st.columns(len(effectifs))
+                for colonne, (niveau, n) in zip(colonnes, effectifs.items()):
+                    colonne.metric(niveau, n)
                 
-                for i, (index, row) in enumerate(df_c.iterrows()):
-                    # Appel au modèle pour chaque ligne
-                    pred = predictor.predict_priority(row)
-                    
-                    results.append({
-                        "Tronçon": row.get('tronçon de voirie'),
-                        "Priorité": pred['label'],
-                        "Score Risque": pred['score'],
-                        "Action Recommandée": pred['action'],
-                        "État Actuel": "Dégradé" if row.get('présence du nid de poule') == 'Oui' else "Stable"
-                    })
-                    progress_bar.progress((i + 1) / len(df_c))
+                # Pagination côté serveur : seule la page affichée est mise en forme et envoyée
+                page = st.number_input("Page du rapport", min_value=1, max_value=view.n_pages, value=1) if view.n_pages > 1 else 1
+                st.dataframe(view.styled_page(page), use_container_width=True)
+                debut = (page - 1) * view.page_size
+                st.caption(f"Tronçons {debut + 1 if len(view) else 0}–{min(debut + view.page_size, len(view))} sur {len(view)}")
                 
-                # Création du tableau de résultats
-                res_df = pd.DataFrame(results)
+                st.warning(f"⚠️ {effectifs[view.urgent]} tronçons nécessitent une intervention immédiate dans cette commune.")
                 
-                # Tri par score de risque (du plus urgent au moins urgent)
-                res_df = res_df.sort_values(by="Score Risque", ascending=False)
+                # Export complet, généré par blocs au clic
+                nom = f"rapport_{ville_sel}_{commune_sel}".replace(' ', '_')
+                e1, e2 = st.columns(2)
+                e1.download_button("⬇️ Exporter (CSV)", data=lambda: view.export('csv'), file_name=f"{nom}.csv", mime="text/csv")
+                e2.download_button("⬇️ Exporter (Parquet)", data=lambda: view.export('parquet'), file_name=f"{nom}.parquet",
+                                   mime="application/octet-stream")
                 
-                # Affichage avec couleurs
-                def highlight_urgent(val):
-                    color = 'red' if 'URGENT' in str(val) else 'black'
-                    return f'color: {color}; font-weight: bold'
+                with st.expander("📅 Programme d'interventions"):
+                    lineaire_total = float(pd.to_numeric(df_c.get('linéaire de voirie(ml)'), errors='coerce').sum())
+                    p1, p2, p3 = st.columns(3)
+                    n_periodes = p1.number_input("Trimestres", min_value=1, max_value=12, value=4)
+                    budget = p2.number_input("Budget par trimestre (ml)", min_value=0.0, value=round(lineaire_total / 4, 0), step=100.0)
+                    capacite = p3.number_input("Interventions par trimestre (équipes)", min_value=0, value=0,
+                                               help="0 : capacité illimitée")
+                    # Scores du rapport, réalignés sur les tronçons de la commune
+                    plan, synthese = MaintenanceScheduler().plan(
+                        df_c, view.report['Score Risque'], budget=budget, n_periods=int(n_periodes),
+                        crew_capacity=int(capacite) or None)
+                    st.dataframe(synthese, hide_index=True, use_container_width=True)
+                    planifies = plan[plan['periode'].notna()].sort_values(['periode', 'rang'])
+                    st.caption(f"{len(planifies)} tronçons programmés sur {len(plan)} ({synthese['methode'].iloc[0]})")
+                    st.dataframe(planifies.head(PLAN_PREVIEW_ROWS), use_container_width=True)
+                    st.download_button("⬇️ Programme complet (CSV)", data=lambda: plan.to_csv(index=False).encode('utf-8'),
+                                       file_name=f"programme_{nom}.csv", mime="text/csv")
 
-                st.subheader("📋 Rapport de Priorisation")
-                st.dataframe(res_df.style.applymap(highlight_urgent, subset=['Priorité']), use_container_width=True)
-                
-                # Statistiques de l'analyse
-                n_urgent = len(res_df[res_df['Priorité'].str.contains('URGENT')])
-                st.warning(f"⚠️ {n_urgent} tronçons nécessitent une intervention immédiate dans cette commune.")
+    if perf.enabled:
+        show_perf_panel(perf.end_run())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
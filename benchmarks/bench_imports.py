@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark du temps d'import des modules du package models.
+
+Chaque module est importé dans un interpréteur neuf (médiane de plusieurs
+essais). Le script échoue si une dépendance lourde est chargée à l'import
+ou si un temps dépasse la référence enregistrée (au-delà de la tolérance)
+ou, sans référence, le budget absolu.
+
+    python benchmarks/bench_imports.py                    # vérification
+    python benchmarks/bench_imports.py --update-baseline  # nouvelle référence
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'import_baseline.json')
+
+MODULES = [
+    'models',
+    'models.predictive_maintenance',
+    'models.image_analysis',
+    'models.pothole_detection',
+    'models.resource_optimization',
+]
+
+# Ne doivent jamais être chargés par un simple import
+HEAVY_MODULES = ['tensorflow', 'keras', 'cv2', 'sklearn', 'joblib']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'secondes': elapsed, 'charges': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeat):
+    timings, loaded = [], set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            return {'secondes': None, 'charges': [], 'erreur': out.stderr.strip().splitlines()[-1]}
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result['secondes'])
+        loaded.update(result['charges'])
+    return {'secondes': statistics.median(timings), 'charges': sorted(loaded)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=1.5, help="facteur maximal par rapport à la référence")
+    parser.add_argument('--budget', type=float, default=1.0, help="budget absolu (s) sans référence")
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    results = {module: measure(module, args.repeat) for module in MODULES}
+
+    try:
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    failures = []
+    for module, result in results.items():
+        reference = baseline.get(module)
+        status = 'ok'
+        if result.get('erreur'):
+            status = f"ÉCHEC ({result['erreur']})"
+        elif result['charges']:
+            status = f"ÉCHEC (charge {', '.join(result['charges'])})"
+        elif reference and not args.update_baseline and result['secondes'] > reference * args.tolerance:
+            status = f"ÉCHEC (référence {reference * 1000:.0f} ms)"
+        elif not reference and result['secondes'] > args.budget:
+            status = f"ÉCHEC (budget {args.budget * 1000:.0f} ms)"
+        if status != 'ok':
+            failures.append(module)
+        duree = f"{result['secondes'] * 1000:8.1f} ms" if result['secondes'] is not None else f"{'-':>11}"
+        print(f"{module:<35} {duree}  {status}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({m: r['secondes'] for m, r in results.items() if r['secondes'] is not None}, f, indent=2)
+        print(f"Référence enregistrée : {BASELINE_PATH}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
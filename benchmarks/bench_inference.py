@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark des moteurs d'inférence du classifieur de défauts.
+
+Chaque moteur (keras .h5, tflite) est chargé dans un interpréteur neuf :
+temps de chargement, latence par lot (p50 / p95), images/s et mémoire
+résidente maximale. Les prédictions sont ensuite comparées à celles du
+modèle Keras d'origine (accord du top-1, écart des probabilités) ; le script
+échoue si l'accord est inférieur à --min-agreement.
+
+    python benchmarks/bench_inference.py --h5 models/defect_detector.h5 \
+        --tflite models/defect_detector_int8.tflite --images data/uploads/troncons
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, statistics, sys, time
+import numpy as np
+sys.path.insert(0, {root!r})
+from models.image_analysis import load_image_array
+from models.inference_backends import load_backend
+
+paths = {paths!r}
+images = np.stack([load_image_array(p) for p in paths])
+
+start = time.perf_counter()
+backend = load_backend({backend!r}, {model_path!r}, {threads!r})
+chargement = time.perf_counter() - start
+
+backend.predict_on_batch(images[:{batch_size}])  # préchauffage
+latences, predictions = [], []
+debut = time.perf_counter()
+for i in range(0, len(images), {batch_size}):
+    t = time.perf_counter()
+    predictions.append(backend.predict_on_batch(images[i:i + {batch_size}]))
+    latences.append(time.perf_counter() - t)
+total = time.perf_counter() - debut
+
+np.save({output!r}, np.concatenate(predictions))
+q = statistics.quantiles(latences, n=20) if len(latences) > 1 else latences * 19
+print(json.dumps({{
+    'chargement_s': chargement,
+    'latence_p50_ms': statistics.median(latences) * 1000,
+    'latence_p95_ms': q[18] * 1000,
+    'images_par_s': len(images) / total,
+    'memoire_max_mo': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def sample_images(directory, count, workdir):
+    """Images du dossier, ou images aléatoires générées dans workdir"""
+    if directory:
+        from models.pothole_detection import iter_image_paths
+        return list(iter_image_paths(directory))[:count]
+
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(workdir, f"image_{i:04d}.png")
+        Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def run_backend(backend, model_path, paths, threads, batch_size, workdir):
+    output = os.path.join(workdir, f"predictions_{backend}.npy")
+    probe = PROBE.format(root=ROOT, paths=paths, backend=backend, model_path=model_path,
+                         threads=threads, batch_size=batch_size, output=output)
+    out = subprocess.run([sys.executable, '-c', probe], cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        return {'erreur': out.stderr.strip().splitlines()[-1]}, None
+    return json.loads(out.stdout.strip().splitlines()[-1]), np.load(output)
+
+
+def agreement(reference, predictions):
+    """Accord du top-1 et écarts absolus des probabilités par rapport à la référence"""
+    ecart = np.abs(reference - predictions)
+    return {
+        'accord_top1': float(np.mean(reference.argmax(axis=1) == predictions.argmax(axis=1))),
+        'ecart_max': float(ecart.max()),
+        'ecart_moyen': float(ecart.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--h5', default='models/defect_detector.h5')
+    parser.add_argument('--tflite', help="modèle exporté par models.inference_backends")
+    parser.add_argument('--images', help="dossier d'images (par défaut : images aléatoires)")
+    parser.add_argument('--count', type=int, default=256)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--min-agreement', type=float, default=0.99, help="accord top-1 minimal avec Keras")
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    moteurs = [('keras', args.h5)] + ([('tflite', args.tflite)] if args.tflite else [])
+    results, failures = {}, []
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = sample_images(args.images, args.count, workdir)
+        predictions = {}
+        for backend, model_path in moteurs:
+            result, preds = run_backend(backend, model_path, paths, args.threads, args.batch_size, workdir)
+            results[backend] = result
+            if preds is not None:
+                predictions[backend] = preds
+
+    for backend, result in results.items():
+        if result.get('erreur'):
+            failures.append(backend)
+            print(f"{backend:<8} ÉCHEC ({result['erreur']})")
+            continue
+        if backend != 'keras' and 'keras' in predictions:
+            result.update(agreement(predictions['keras'], predictions[backend]))
+            if result['accord_top1'] < args.min_agreement:
+                failures.append(backend)
+        accord = f"  accord {result['accord_top1']:.2%}  écart max {result['ecart_max']:.4f}" if 'accord_top1' in result else ''
+        print(f"{backend:<8} chargement {result['chargement_s']:6.2f} s  "
+              f"p50 {result['latence_p50_ms']:8.1f} ms  p95 {result['latence_p95_ms']:8.1f} ms  "
+              f"{result['images_par_s']:8.1f} img/s  {result['memoire_max_mo']:7.0f} Mo{accord}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'images': len(paths), 'batch_size': args.batch_size, 'resultats': results}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
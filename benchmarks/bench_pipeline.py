@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout sur des feuilles synthétiques.
+
+Pour chaque taille (1k, 100k, 1M tronçons par défaut), chaque étape est
+chronométrée, puis rejouée sous tracemalloc pour son pic mémoire. Les résultats sont écrits
+en JSON ; avec --baseline, le script échoue si une étape est plus lente que
+la référence au-delà du seuil.
+
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 1000 100000 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_sheet, to_excel_bytes  # noqa: E402
+
+from models.maintenance_scheduler import MaintenanceScheduler  # noqa: E402
+from models.predictive_maintenance import MaintenancePredictor  # noqa: E402
+from models.resource_optimization import UrbanResourceOptimizer  # noqa: E402
+from services.data_cache import ExcelSnapshotCache, parse_workbook  # noqa: E402
+from services.dtypes import compact_dtypes  # noqa: E402
+from services.geo import assign_coordinates  # noqa: E402
+from services.map_render import render_map_html  # noqa: E402
+from services.partition_index import PartitionIndex  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+# Au-delà, écrire le classeur synthétique prendrait plusieurs minutes
+MAX_EXCEL_ROWS = 100_000
+# La version ligne à ligne est mesurée sur un échantillon
+ROW_SCORING_SAMPLE = 5_000
+
+
+def warm_up():
+    """Charge à l'avance les dépendances importées au premier usage (voir bench_imports)"""
+    import folium.plugins  # noqa: F401
+    import sklearn.cluster  # noqa: F401
+    import sklearn.metrics  # noqa: F401
+
+
+def measure(func, *args, track_memory=True, **kwargs):
+    """
+    Durée d'un appel, puis pic mémoire mesuré sur un second appel : tracemalloc
+    ralentit fortement les étapes qui créent beaucoup d'objets Python.
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    peak = None
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def lighting_frame(df):
+    """Colonnes attendues par UrbanResourceOptimizer.optimize_lighting"""
+    return df.assign(
+        **{
+            'linéaire_ml': df['linéaire de voirie(ml)'],
+            'points_lumineux': df['Nombre de point lumineux sur le tronçon'].fillna(0),
+            'traffic_estimate': df['linéaire de voirie(ml)'] * 0.5,
+        }
+    )
+
+
+def run_size(n_rows, cache_dir, track_memory=True):
+    """Liste de résultats (étape, secondes, pic mémoire) pour une taille"""
+    raw = generate_sheet(n_rows)
+    results = []
+
+    def record(stage, func, *args, rows=n_rows, **kwargs):
+        value, elapsed, peak = measure(func, *args, track_memory=track_memory, **kwargs)
+        peak_mb = peak / 1e6 if peak is not None else None
+        results.append({'taille': n_rows, 'etape': stage, 'lignes': rows,
+                         'secondes': elapsed, 'pic_memoire_mo': peak_mb})
+        memoire = f"{peak_mb:9.1f} Mo" if peak_mb is not None else ""
+        print(f"{n_rows:>9} {stage:<28} {elapsed:9.3f} s {memoire}", flush=True)
+        return value
+
+    # Chargement : parsing Excel (si la taille le permet) puis instantané local
+    if n_rows <= MAX_EXCEL_ROWS:
+        content = to_excel_bytes(raw)
+        df = record('load_data.parse_excel', parse_workbook, content)
+    else:
+        df = raw.rename(columns=str.strip)
+    cache = ExcelSnapshotCache(f"http://bench/{n_rows}.xlsx", cache_dir=cache_dir)
+    fmt = cache.write_snapshot(df)
+    record('load_data.read_snapshot', cache.read_snapshot, {'format': fmt})
+    df = record('load_data.coordinates', assign_coordinates, df)
+    df = record('load_data.compact', compact_dtypes, df)
+
+    index = record('partition_index.build', PartitionIndex, df)
+    ville = index.villes[0]
+    record('partition_index.lookup', index.subset, ville, index.communes(ville)[0], rows=1)
+
+    predictor = MaintenancePredictor()
+    preds = record('predict_priority.batch', predictor.predict_priority_batch, df)
+    # Programme sur 4 trimestres : 5 % du linéaire total par trimestre, 1 tronçon sur 50 par équipe
+    budget = float(df['linéaire de voirie(ml)'].sum()) * 0.05
+    record('scheduler.plan', MaintenanceScheduler().plan, df, preds, budget=budget, crew_capacity=max(n_rows // 50, 1))
+    sample = df.head(ROW_SCORING_SAMPLE)
+    record('predict_priority.rows', lambda d: [predictor.predict_priority(r) for _, r in d.iterrows()], sample, rows=len(sample))
+
+    record('map.render', render_map_html, df)
+
+    optimizer = UrbanResourceOptimizer()
+    lighting = lighting_frame(df)
+    record('optimizer.lighting', optimizer.optimize_lighting, lighting, scalable=n_rows > 100_000)
+    record('optimizer.degradation', optimizer.project_degradation, df)
+    return results
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """Étapes plus lentes que la référence de plus de threshold (relatif)"""
+    reference = {(r['taille'], r['etape']): r['secondes'] for r in baseline.get('resultats', [])}
+    regressions = []
+    for r in results:
+        ref = reference.get((r['taille'], r['etape']))
+        if ref is None or max(ref, r['secondes']) < min_seconds:
+            continue
+        if r['secondes'] > ref * (1 + threshold):
+            regressions.append({**r, 'reference': ref})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--output', help="fichier JSON des résultats")
+    parser.add_argument('--baseline', help="résultats de référence (JSON produit par --output)")
+    parser.add_argument('--threshold', type=float, default=0.25, help="ralentissement relatif toléré")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="étapes plus rapides ignorées")
+    parser.add_argument('--no-memory', action='store_true', help="ne pas mesurer le pic mémoire (deux fois plus rapide)")
+    args = parser.parse_args()
+
+    warm_up()
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for n_rows in args.sizes:
+            results.extend(run_size(n_rows, cache_dir, track_memory=not args.no_memory))
+
+    report = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'resultats': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_seconds)
+        for r in regressions:
+            print(f"RÉGRESSION {r['etape']} @ {r['taille']} : {r['secondes']:.3f} s (référence {r['reference']:.3f} s)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
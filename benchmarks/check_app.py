@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Vérification de bout en bout de l'application (streamlit.testing.AppTest).
+
+Un classeur synthétique est servi par un manifeste local ; l'application est
+exécutée sans navigateur, l'analyse IA est lancée, puis chaque bouton de
+téléchargement est réellement généré par le gestionnaire de fichiers de
+Streamlit (données différées comprises). Le script échoue sur toute
+exception de l'application ou tout téléchargement impossible.
+
+    python benchmarks/check_app.py
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def capture_deferred_downloads():
+    """Enregistre (gestionnaire, identifiant, nom de fichier) de chaque téléchargement différé"""
+    from streamlit.runtime.media_file_manager import MediaFileManager
+
+    captured = []
+    add_deferred = MediaFileManager.add_deferred
+
+    def recording(self, data_callable, mimetype, coordinates, file_name=None):
+        file_id = add_deferred(self, data_callable, mimetype, coordinates, file_name=file_name)
+        captured.append((self, file_id, file_name))
+        return file_id
+
+    MediaFileManager.add_deferred = recording
+    return captured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.synthetic import generate_sheet, to_excel_bytes
+    from streamlit.testing.v1 import AppTest
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, 'indicateurs.xlsx'), 'wb') as f:
+            f.write(to_excel_bytes(generate_sheet(args.rows)))
+        manifest = os.path.join(workdir, 'manifest.json')
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump({'shards': [{'name': 'synthetique', 'url': 'indicateurs.xlsx'}]}, f)
+        os.environ['URBAN_AI_MANIFEST'] = manifest
+        os.environ['URBAN_AI_CACHE_DIR'] = os.path.join(workdir, 'cache')
+        os.chdir(ROOT)
+
+        downloads = capture_deferred_downloads()
+        at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=args.timeout)
+        at.session_state['authenticated'] = True
+        at.run()
+        boutons = [b for b in at.button if 'Lancer' in b.label]
+        if not boutons:
+            failures.append("bouton d'analyse IA absent")
+        else:
+            boutons[0].click().run()
+        failures.extend(f"exception : {e.message}" for e in at.exception)
+
+        if boutons and not downloads:
+            failures.append("aucun téléchargement généré")
+        for manager, file_id, file_name in downloads:
+            try:
+                manager.execute_deferred(file_id)
+                print(f"{file_name:<45} ok")
+            except Exception as e:
+                failures.append(f"{file_name} : {e}")
+                print(f"{file_name:<45} ÉCHEC ({e})")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# synthetic.py
+"""
+Générateur de feuilles synthétiques au format d'indicateurs_urbains.xlsx
+(mêmes noms de colonnes, y compris l'espace final de la colonne superficie).
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+COMMUNES = {
+    'Yaounde': [f'Yaounde {i}' for i in range(1, 8)],
+    'Douala': [f'Douala {i}' for i in range(1, 7)],
+}
+CLASSES = ['Primaire', 'Secondaire', 'Tertiaire', None]
+
+
+def generate_sheet(n_rows, seed=42, degraded_share=0.3):
+    """DataFrame brut (avant nettoyage des en-têtes) de n_rows tronçons"""
+    rng = np.random.default_rng(seed)
+    villes = rng.choice(list(COMMUNES), n_rows)
+    communes = np.empty(n_rows, dtype=object)
+    for ville, noms in COMMUNES.items():
+        mask = villes == ville
+        communes[mask] = rng.choice(noms, mask.sum())
+
+    numeros = np.arange(1, n_rows + 1).astype(str)
+    nid_poule = np.where(rng.random(n_rows) < degraded_share, 'Oui', None)
+    lumieres = rng.integers(0, 40, n_rows).astype(float)
+    lumieres[rng.random(n_rows) < 0.2] = np.nan
+    images = np.where(rng.random(n_rows) < 0.05, 'Douala 1.jpg', None)
+
+    return pd.DataFrame({
+        'Ville': villes,
+        'Nom de la Commune': communes,
+        'Nom de la poche du quartier de taudis': np.char.add('poche ', numeros),
+        'superficie de la poche du quartier de taudis ': rng.gamma(2.0, 60000.0, n_rows).round(),
+        'présence du nid de poule': pd.Series(nid_poule, dtype=object),
+        'tronçon de voirie': np.char.add('ligne ', numeros),
+        'linéaire de voirie(ml)': rng.gamma(2.0, 600.0, n_rows).round(),
+        'classe de voirie': pd.Series(rng.choice(np.array(CLASSES, dtype=object), n_rows), dtype=object),
+        'Nombre de point lumineux sur le tronçon': lumieres,
+        'image_troncon': pd.Series(images, dtype=object),
+        'image_taudis': pd.Series(None, index=range(n_rows), dtype=object),
+    })
+
+
+def to_excel_bytes(df):
+    """Classeur .xlsx en mémoire (lent au-delà de quelques centaines de milliers de lignes)"""
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
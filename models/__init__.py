@@ -0,0 +1,30 @@
+# Package des modèles d'IA
+"""
+Les dépendances lourdes (TensorFlow, OpenCV, scikit-learn, joblib) ne sont
+importées qu'au premier usage. Les indicateurs ci-dessous disent seulement
+si elles sont installées, sans les charger.
+"""
+from importlib.util import find_spec
+
+
+def _installed(module):
+    try:
+        return find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+HAS_IMAGE_ANALYSIS = _installed('tensorflow')           # RoadDefectDetector (CNN)
+HAS_POTHOLE_DETECTION = _installed('cv2')               # pothole_detection
+HAS_RESOURCE_OPTIMIZATION = _installed('sklearn')       # UrbanResourceOptimizer
+HAS_JOBLIB = _installed('joblib')                       # nécessaire pour charger un .pkl de MaintenancePredictor
+
+
+def capabilities():
+    """Fonctionnalités disponibles dans cet environnement"""
+    return {
+        'image_analysis': HAS_IMAGE_ANALYSIS,
+        'pothole_detection': HAS_POTHOLE_DETECTION,
+        'resource_optimization': HAS_RESOURCE_OPTIMIZATION,
+        'joblib': HAS_JOBLIB,
+    }
@@ -1,61 +1,209 @@
 # image_analysis.py
-import cv2
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+
+from models.inference_backends import load_backend
+from models.pothole_detection import detect_potholes_cached
+from models.registry import file_hash
+from models.result_cache import DEFAULT_CACHE_PATH, AnalysisCache, image_hash
+from services.perf import span, timed
+
+# Résultats gardés par analyze_road_images pour les doublons d'un même appel (par hash de contenu)
+DEDUP_MAX_ENTRIES = 10000
+
+
+def load_image_array(img_path, target_size=(224, 224)):
+    """
+    Décode et redimensionne une image en tableau float32 (H, W, 3) normalisé.
+    Reproduit keras load_img (RGB, redimensionnement au plus proche voisin)
+    sans importer TensorFlow.
+    """
+    from PIL import Image
+    with Image.open(img_path) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        size = (target_size[1], target_size[0])
+        if img.size != size:
+            img = img.resize(size, Image.NEAREST)
+        img_array = np.asarray(img, dtype=np.float32)
+    return img_array / 255.0
+
 
 class RoadDefectDetector:
-    def __init__(self, model_path='models/defect_detector.h5'):
-        self.model = load_model(model_path)
+    def __init__(self, model_path='models/defect_detector.h5', cache_path=DEFAULT_CACHE_PATH,
+                 backend='keras', num_threads=None):
+        """
+        backend : 'keras' (model_path .h5) ou 'tflite' (model_path .tflite exporté
+        par inference_backends, éventuellement quantifié int8) ; num_threads :
+        threads d'inférence CPU. cache_path : base SQLite des résultats (None
+        pour tout recalculer).
+        """
+        # TensorFlow (ou l'interpréteur TFLite) n'est chargé qu'à la création du détecteur
+        self.backend = load_backend(backend, model_path, num_threads)
+        self.model = self.backend.model
         self.classes = ['bon_etat', 'nids_poule', 'fissures', 'deformation']
+        self.input_size = (224, 224)
+        self.last_run_stats = None
+        
+        # Version = contenu du modèle chargé + prétraitement : un nouveau modèle invalide le cache
+        self.version = f"{self.backend.name}:{file_hash(model_path)[:16]}:{self.input_size[0]}x{self.input_size[1]}:{','.join(self.classes)}"
+        self.cache = AnalysisCache(cache_path) if cache_path else None
+    
+    def purge_cache(self, keep_versions=()):
+        """
+        Maintenance : supprime les résultats de classification des autres versions
+        (ancien modèle, autre moteur), sauf celles de keep_versions — par exemple
+        la version d'un détecteur tflite encore utilisé à côté de celui-ci.
+        Retourne le nombre d'entrées supprimées.
+        """
+        if self.cache is None:
+            return 0
+        return self.cache.purge('defauts', [self.version, *keep_versions])
+    
+    def load_image_array(self, img_path):
+        """Décode et redimensionne une image en tableau float32 (H, W, 3) normalisé"""
+        return load_image_array(img_path, self.input_size)
     
     def preprocess_image(self, img_path):
         """Prépare l'image pour l'analyse"""
-        img = image.load_img(img_path, target_size=(224, 224))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array /= 255.0
-        
-        return img_array
+        return np.expand_dims(self.load_image_array(img_path), axis=0)
     
-    def analyze_road_image(self, img_path):
-        """Analyse une image de route"""
-        processed_img = self.preprocess_image(img_path)
-        predictions = self.model.predict(processed_img)
-        class_idx = np.argmax(predictions[0])
-        
+    def _format_prediction(self, prediction):
+        class_idx = np.argmax(prediction)
         return {
             'etat': self.classes[class_idx],
-            'confiance': float(predictions[0][class_idx]),
-            'details': dict(zip(self.classes, predictions[0].tolist()))
+            'confiance': float(prediction[class_idx]),
+            'details': dict(zip(self.classes, prediction.tolist()))
         }
     
-    def detect_potholes(self, img_path):
-        """Détection spécifique des nids-de-poule"""
-        img = cv2.imread(img_path)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Détection des contours
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        
-        # Trouver les contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def _cached(self, img_path):
+        """(hash de l'image, résultat en cache ou None), sans décoder l'image"""
+        if self.cache is None:
+            return None, None
+        sha = image_hash(img_path)
+        return sha, self.cache.get('defauts', sha, self.version)
+    
+    @timed('analyze_road_image')
+    def analyze_road_image(self, img_path):
+        """Analyse une image de route"""
+        sha, cached = self._cached(img_path)
+        if cached is not None:
+            return cached
+        processed_img = self.preprocess_image(img_path)
+        predictions = self.backend.predict_on_batch(processed_img)
+        result = self._format_prediction(predictions[0])
+        if sha is not None:
+            self.cache.put('defauts', sha, self.version, result)
+        return result
+    
+    def _prepare(self, img_path):
+        # Tâche du pool : cache d'abord, décodage seulement en cas d'absence
+        sha, cached = self._cached(img_path)
+        if cached is not None:
+            return sha, cached, None
+        if sha is None:
+            sha = image_hash(img_path)  # clé de déduplication, même sans cache
+        return sha, None, self.load_image_array(img_path)
+    
+    def analyze_road_images(self, img_paths, batch_size=32, workers=4, prefetch_batches=2):
+        """
+        Analyse un ensemble d'images par lots (générateur, dans l'ordre des chemins ;
+        une image illisible produit un dict {'image', 'erreur'}).
+        Le décodage tourne dans un pool de threads en avance sur l'inférence ;
+        chaque lot est empilé dans un unique tampon float32 préalloué.
+        Les images déjà analysées (même contenu, même modèle) sont servies par
+        le cache sans décodage ; les doublons de contenu d'un même appel ne
+        sont inférés qu'une fois. Le débit (images/s) est disponible dans
+        self.last_run_stats.
+        """
+        buffer = np.empty((batch_size, *self.input_size, 3), dtype=np.float32)
+        n_images = n_cached = n_doublons = 0
+        # Résultats déjà calculés pendant cet appel (les lectures de cache des images
+        # préchargées ont eu lieu avant leur écriture)
+        known = {}
+        start = time.perf_counter()
         
-        # Filtrer les contours (nids-de-poule)
-        potholes = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if 100 < area < 10000:  # Taille raisonnable pour un nid-de-poule
-                x, y, w, h = cv2.boundingRect(contour)
-                potholes.append({
-                    'position': {'x': x, 'y': y},
-                    'dimensions': {'largeur': w, 'hauteur': h},
-                    'superficie': area
-                })
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            paths = iter(img_paths)
+            
+            def fill():
+                # Garde jusqu'à prefetch_batches lots de décodage en vol
+                while len(pending) < batch_size * (prefetch_batches + 1):
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    pending.append((path, pool.submit(self._prepare, path)))
+            
+            fill()
+            while pending:
+                # entries : (chemin, hash, position dans le tampon, résultat en cache ou message d'erreur)
+                entries, slots, n_batch = [], {}, 0
+                while pending and n_batch < batch_size:
+                    path, future = pending.popleft()
+                    try:
+                        sha, cached, array = future.result()
+                    except Exception as e:
+                        entries.append((path, None, None, str(e)))
+                        continue
+                    if cached is not None:
+                        entries.append((path, sha, None, cached))
+                        n_cached += 1
+                        continue
+                    if sha in known:
+                        entries.append((path, sha, None, known[sha]))
+                        n_doublons += 1
+                        continue
+                    if sha in slots:
+                        # Même contenu plus haut dans le lot : une seule inférence
+                        entries.append((path, sha, slots[sha], None))
+                        n_doublons += 1
+                        continue
+                    buffer[n_batch] = array
+                    slots[sha] = n_batch
+                    entries.append((path, sha, n_batch, None))
+                    n_batch += 1
+                fill()
+                
+                with span('analyze_road_images.batch'):
+                    predictions = self.backend.predict_on_batch(buffer[:n_batch]) if n_batch else None
+                for path, sha, slot, other in entries:
+                    if isinstance(other, str):
+                        yield {'image': path, 'erreur': other}
+                        continue
+                    if other is not None:
+                        result = dict(other)
+                    elif sha in known:
+                        result = dict(known[sha])
+                    else:
+                        result = self._format_prediction(predictions[slot])
+                        if self.cache is not None:
+                            self.cache.put('defauts', sha, self.version, result)
+                        known[sha] = result
+                        if len(known) > DEDUP_MAX_ENTRIES:
+                            known.pop(next(iter(known)))
+                        result = dict(result)
+                    result['image'] = path
+                    yield result
+                n_images += n_batch
         
-        return {
-            'nombre_nids_poule': len(potholes),
-            'superficie_totale': sum(p['superficie'] for p in potholes),
-            'details': potholes
-        }
\ No newline at end of file
+        elapsed = time.perf_counter() - start
+        self.last_run_stats = {
+            'images': n_images,
+            'depuis_cache': n_cached,
+            'doublons': n_doublons,
+            'secondes': elapsed,
+            'images_par_seconde': n_images / elapsed if elapsed > 0 else 0.0,
+        }
+    
+    def detect_potholes(self, img_path, max_side=None):
+        """Détection spécifique des nids-de-poule (voir pothole_detection), avec cache"""
+        return detect_potholes_cached(img_path, max_side=max_side, cache=self.cache)
+    
+    def detect_potholes_tiled(self, img_path, gsd_m=None, **kwargs):
+        """Détection par tuiles des très grandes images (orthophotos, panoramas), voir tiled_detection"""
+        from models.tiled_detection import detect_potholes_tiled
+        return detect_potholes_tiled(img_path, gsd_m=gsd_m, **kwargs)
\ No newline at end of file
@@ -0,0 +1,161 @@
+# inference_backends.py
+"""
+Moteurs d'inférence du classifieur de défauts (RoadDefectDetector).
+
+- 'keras'  : le modèle .h5 d'origine, via TensorFlow/Keras ;
+- 'tflite' : le même classifieur exporté en .tflite (float ou quantifié
+  int8), exécuté par un interpréteur TFLite léger (ai-edge-litert ou
+  tflite-runtime, TensorFlow en dernier recours).
+
+Les deux exposent predict_on_batch(x) : x float32 (n, H, W, 3) normalisé
+dans [0, 1], retour float32 (n, classes).
+
+Export :
+    python -m models.inference_backends models/defect_detector.h5 models/defect_detector_int8.tflite \
+        --quantization int8 --calibration data/uploads/troncons
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+BACKENDS = ('keras', 'tflite')
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError:
+                # TensorFlow déjà initialisé dans ce processus : réglage ignoré
+                pass
+        self.model = tf.keras.models.load_model(model_path)
+        self.input_shape = tuple(self.model.input_shape[1:3])
+
+    def predict_on_batch(self, x):
+        return np.asarray(self.model.predict_on_batch(x), dtype=np.float32)
+
+
+def _tflite_interpreter():
+    """Classe Interpreter du paquet disponible, du plus léger au plus lourd"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        Interpreter = _tflite_interpreter()
+        self.model = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.model.allocate_tensors()
+        self._refresh_details()
+        self.input_shape = tuple(self._input['shape'][1:3])
+
+    def _refresh_details(self):
+        self._input = self.model.get_input_details()[0]
+        self._output = self.model.get_output_details()[0]
+
+    def _resize(self, n):
+        # Taille de lot variable : le tenseur d'entrée est redimensionné à la demande
+        if self._input['shape'][0] != n:
+            self.model.resize_tensor_input(self._input['index'], [n, *self._input['shape'][1:]])
+            self.model.allocate_tensors()
+            self._refresh_details()
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        self._resize(len(x))
+        dtype = self._input['dtype']
+        if dtype in (np.int8, np.uint8):
+            # Modèle quantifié : x_q = x / scale + zero_point
+            scale, zero_point = self._input['quantization']
+            info = np.iinfo(dtype)
+            x = np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(dtype)
+        self.model.set_tensor(self._input['index'], x)
+        self.model.invoke()
+        out = self.model.get_tensor(self._output['index'])
+        if self._output['dtype'] in (np.int8, np.uint8):
+            scale, zero_point = self._output['quantization']
+            out = (out.astype(np.float32) - zero_point) * scale
+        return np.asarray(out, dtype=np.float32)
+
+
+def load_backend(backend, model_path, num_threads=None):
+    if backend == 'keras':
+        return KerasBackend(model_path, num_threads)
+    if backend == 'tflite':
+        return TFLiteBackend(model_path, num_threads)
+    raise ValueError(f"Moteur inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+
+
+def export_tflite(h5_path, output_path, quantization=None, calibration_paths=(), load_image_array=None):
+    """
+    Exporte le modèle Keras en .tflite.
+    quantization : None (float32), 'dynamic' (poids int8) ou 'int8' (entrées,
+    sorties et activations int8, calibrées sur calibration_paths via
+    load_image_array(path) -> tableau (H, W, 3)).
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(h5_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization in ('dynamic', 'int8'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        paths = list(calibration_paths)
+        if not paths or load_image_array is None:
+            raise ValueError("La quantification int8 demande des images de calibration")
+
+        def representative_dataset():
+            for path in paths:
+                yield [load_image_array(path)[None, ...].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif quantization not in (None, 'dynamic'):
+        raise ValueError(f"Quantification inconnue : {quantization}")
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    return output_path
+
+
+def main(argv=None):
+    from models.image_analysis import load_image_array
+    from models.pothole_detection import iter_image_paths
+
+    parser = argparse.ArgumentParser(description="Export .h5 -> .tflite du classifieur de défauts")
+    parser.add_argument('h5')
+    parser.add_argument('output')
+    parser.add_argument('--quantization', choices=['dynamic', 'int8'], default=None)
+    parser.add_argument('--calibration', help="dossier d'images représentatives (int8)")
+    parser.add_argument('--max-calibration', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    paths = []
+    if args.calibration:
+        paths = list(iter_image_paths(args.calibration))[:args.max_calibration]
+    export_tflite(args.h5, args.output, args.quantization, paths, load_image_array)
+    print(f"Modèle exporté : {args.output} ({os.path.getsize(args.output) / 1e6:.1f} Mo)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# maintenance_scheduler.py
+"""
+Programme pluri-périodique d'interventions sous contrainte de budget et
+de capacité des équipes.
+
+Chaque tronçon a une valeur (score de risque de MaintenancePredictor) et un
+coût (linéaire de voirie x coût au mètre). L'ordre de priorité ne dépend
+pas de la période : la file de priorité est un seul tri (densité score /
+coût par défaut), puis chaque tronçon est affecté à la première période
+dont le budget restant et la capacité des équipes le permettent — O(n log n)
+pour le tri, O(n x périodes) au pire pour l'affectation.
+
+Pour les petites instances, un sac à dos 0/1 (programmation dynamique,
+période par période, avec la capacité en nombre d'interventions) remplace
+le glouton s'il traite davantage de risque. Il est exact si les coûts sont
+entiers et la table assez petite ; sinon les coûts sont arrondis par excès
+à une grille du budget et le résultat est signalé comme approché.
+"""
+import numpy as np
+
+from services.perf import timed
+
+COST_COLUMN = 'linéaire de voirie(ml)'
+
+# Au-delà, la programmation dynamique exacte n'est pas tentée
+EXACT_MAX_ITEMS = 60
+EXACT_MAX_CELLS = 20_000_000
+# Résolution du budget pour le sac à dos approché : coûts arrondis au 1/EXACT_BUDGET_UNITS du budget (par excès)
+EXACT_BUDGET_UNITS = 2000
+
+STRATEGIES = ('ratio', 'score')
+
+
+def _per_period(value, n_periods, name):
+    """Valeur par période : nombre (répété), liste de n_periods valeurs, ou None (illimité)"""
+    if value is None:
+        return [np.inf] * n_periods
+    if np.ndim(value) == 0:
+        return [float(value)] * n_periods
+    values = [np.inf if v is None else float(v) for v in value]
+    if len(values) != n_periods:
+        raise ValueError(f"{name} : {len(values)} valeurs pour {n_periods} périodes")
+    return values
+
+
+def knapsack(costs, values, budget, capacity=None, budget_units=EXACT_BUDGET_UNITS, max_cells=EXACT_MAX_CELLS):
+    """
+    Sac à dos 0/1 : (rangs des éléments maximisant la somme de values avec un
+    coût total <= budget et au plus capacity éléments, exact).
+    Coûts entiers et table de taille <= max_cells : résolution exacte sur les
+    coûts eux-mêmes (exact=True). Sinon les coûts sont arrondis par excès à
+    budget / budget_units près : la solution respecte le budget réel mais
+    peut manquer un ajustement serré (exact=False).
+    None si même la table arrondie dépasse max_cells cellules.
+    """
+    costs = np.asarray(costs, dtype=float)
+    values = np.asarray(values, dtype=float)
+    n = len(costs)
+    if n == 0 or budget <= 0:
+        return np.empty(0, dtype=np.intp), True
+    # Capacité au moins égale au nombre d'éléments : une seule ligne, sans compter les éléments
+    counted = capacity is not None and capacity < n
+    rows = int(capacity) + 1 if counted else 1
+
+    integral = bool(np.all(costs == np.round(costs)))
+    size = int(np.floor(budget + 1e-9))
+    exact = integral and n * rows * (size + 1) <= max_cells
+    if exact:
+        weights = np.round(costs).astype(np.int64)
+    else:
+        unit = max(budget / budget_units, 1e-9)
+        size = int(np.floor(budget / unit + 1e-9))
+        weights = np.ceil(costs / unit - 1e-9).astype(np.int64)
+        if n * rows * (size + 1) > max_cells:
+            return None
+
+    # best[k, b] : meilleure valeur avec k éléments (ou sans compter) et un coût <= b
+    best = np.full((rows, size + 1), -np.inf)
+    best[0] = 0.0
+    taken = np.zeros((n, rows, size + 1), dtype=bool)
+    for i in range(n):
+        w, v = weights[i], values[i]
+        if w > size:
+            continue
+        if counted:
+            candidate = best[:-1, :size + 1 - w] + v
+            improved = candidate > best[1:, w:]
+            best[1:, w:] = np.where(improved, candidate, best[1:, w:])
+            taken[i, 1:, w:] = improved
+        else:
+            candidate = best[0, :size + 1 - w] + v
+            improved = candidate > best[0, w:]
+            best[0, w:] = np.where(improved, candidate, best[0, w:])
+            taken[i, 0, w:] = improved
+
+    # Remontée depuis la meilleure case (budget entier)
+    k = int(np.argmax(best[:, size])) if counted else 0
+    b = size
+    chosen = []
+    for i in range(n - 1, -1, -1):
+        if taken[i, k, b]:
+            chosen.append(i)
+            b -= weights[i]
+            if counted:
+                k -= 1
+    return np.asarray(chosen[::-1], dtype=np.intp), exact
+
+
+class MaintenanceScheduler:
+    def __init__(self, cost_per_ml=1.0, cost_column=COST_COLUMN, strategy='ratio',
+                 exact_max_items=EXACT_MAX_ITEMS, exact_max_cells=EXACT_MAX_CELLS):
+        """
+        cost_per_ml : coût d'un mètre linéaire (budget exprimé dans la même unité ;
+        1.0 : budget en mètres linéaires).
+        strategy : 'ratio' (risque traité par unité de coût) ou 'score'
+        (plus urgent d'abord, comme le rapport de priorisation).
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Stratégie inconnue : {strategy} (attendu : {', '.join(STRATEGIES)})")
+        self.cost_per_ml = cost_per_ml
+        self.cost_column = cost_column
+        self.strategy = strategy
+        self.exact_max_items = exact_max_items
+        self.exact_max_cells = exact_max_cells
+
+    def costs(self, data):
+        import pandas as pd
+        if self.cost_column not in data.columns:
+            raise KeyError(f"Colonne de coût absente : {self.cost_column}")
+        lineaire = pd.to_numeric(data[self.cost_column], errors='coerce').to_numpy(dtype=float)
+        return lineaire * self.cost_per_ml
+
+    def priority_order(self, costs, values):
+        """Rangs des tronçons, du plus prioritaire au moins prioritaire (ordre stable)"""
+        if self.strategy == 'ratio':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(costs > 0, values / costs, np.inf)
+            # Densité décroissante, puis score décroissant, puis coût croissant
+            return np.lexsort((costs, -values, -ratio))
+        return np.lexsort((costs, -values))
+
+    def _greedy(self, order, costs, budgets, capacities):
+        """Affectation première-période-possible dans l'ordre de priorité"""
+        n_periods = len(budgets)
+        remaining = list(budgets)
+        slots = list(capacities)
+        period = np.full(len(costs), -1, dtype=np.int64)
+        min_cost = costs[order].min() if len(order) else 0.0
+        first_open = 0
+        for i, cost in zip(order.tolist(), costs[order].tolist()):
+            for p in range(first_open, n_periods):
+                if cost <= remaining[p] and slots[p] >= 1:
+                    period[i] = p
+                    remaining[p] -= cost
+                    slots[p] -= 1
+                    break
+            # Périodes pleines (plus d'équipe ou plus assez de budget pour aucun tronçon) : ignorées ensuite
+            while first_open < n_periods and (slots[first_open] < 1 or remaining[first_open] < min_cost):
+                first_open += 1
+            if first_open == n_periods:
+                break
+        return period
+
+    def _exact(self, candidates, costs, values, budgets, capacities):
+        """Sac à dos période par période sur les tronçons restants : (périodes, exact), None si trop grand"""
+        period = np.full(len(costs), -1, dtype=np.int64)
+        remaining = np.asarray(candidates)
+        exact = True
+        for p, (budget, capacity) in enumerate(zip(budgets, capacities)):
+            if not len(remaining):
+                break
+            if not np.isfinite(budget):
+                # Budget illimité : les plus forts scores dans la limite de la capacité
+                ranked = remaining[np.lexsort((costs[remaining], -values[remaining]))]
+                chosen = ranked[:int(capacity)] if np.isfinite(capacity) else ranked
+            else:
+                solution = knapsack(costs[remaining], values[remaining], budget,
+                                    None if not np.isfinite(capacity) else int(capacity), max_cells=self.exact_max_cells)
+                if solution is None:
+                    return None
+                picks, period_exact = solution
+                exact = exact and period_exact
+                chosen = remaining[picks]
+            period[chosen] = p
+            remaining = remaining[period[remaining] < 0]
+        return period, exact
+
+    @timed('plan_interventions')
+    def plan(self, data, scores=None, budget=None, n_periods=4, crew_capacity=None, refine=True):
+        """
+        Programme d'interventions.
+        scores : scores de risque (Series alignée sur data, tableau, ou DataFrame
+        de predict_priority_batch) ; par défaut calculés par MaintenancePredictor.
+        budget : budget par période (nombre, ou une valeur par période) ;
+        crew_capacity : interventions par période (nombre, liste ou None : illimité).
+        refine : sac à dos si l'instance est assez petite.
+        Retourne (plan, synthese) : une ligne par tronçon (période 1..n ou <NA>,
+        rang dans la période, statut) et une ligne par période ; la colonne
+        methode vaut 'glouton', 'exact' (sac à dos sur coûts entiers) ou
+        'approché' (sac à dos sur coûts arrondis, optimalité non garantie).
+        """
+        import pandas as pd
+
+        if budget is None:
+            raise ValueError("Budget par période requis")
+        if np.ndim(budget):
+            n_periods = len(budget)
+        budgets = _per_period(budget, n_periods, 'budget')
+        capacities = _per_period(crew_capacity, n_periods, 'crew_capacity')
+
+        if scores is None:
+            from models.predictive_maintenance import MaintenancePredictor
+            scores = MaintenancePredictor().predict_priority_batch(data)
+        if isinstance(scores, pd.DataFrame):
+            scores = scores['score']
+        if isinstance(scores, pd.Series):
+            scores = scores.reindex(data.index)
+        values = np.asarray(scores, dtype=float)
+        costs = self.costs(data)
+
+        known = ~np.isnan(costs) & ~np.isnan(values) & (costs >= 0)
+        eligible = known & (costs <= max(budgets))
+        order = self.priority_order(costs, values)
+        order = order[eligible[order]]
+
+        period = self._greedy(order, costs, budgets, capacities)
+        methode = 'glouton'
+        if refine and 0 < len(order) <= self.exact_max_items:
+            solution = self._exact(order, costs, values, budgets, capacities)
+            if solution is not None and values[solution[0] >= 0].sum() >= values[period >= 0].sum():
+                period, methode = solution[0], 'exact' if solution[1] else 'approché'
+
+        # Rang dans la période : ordre de priorité
+        rank = np.zeros(len(costs), dtype=np.int64)
+        planned_order = order[period[order] >= 0]
+        if len(planned_order):
+            p = period[planned_order]
+            by_period = planned_order[np.argsort(p, kind='stable')]
+            starts = np.searchsorted(np.sort(p), np.arange(n_periods))
+            positions = np.arange(len(by_period)) - starts[period[by_period]]
+            rank[by_period] = positions + 1
+
+        planned = period >= 0
+        statut = np.select(
+            [planned, ~known, known & ~eligible],
+            ['planifié', 'coût inconnu', 'hors budget'],
+            default='reporté',
+        )
+        plan = pd.DataFrame({
+            'troncon': data['tronçon de voirie'].to_numpy() if 'tronçon de voirie' in data.columns else np.arange(len(data)),
+            'score': values,
+            'cout': costs,
+            'periode': pd.arrays.IntegerArray(period + 1, ~planned),
+            'rang': pd.arrays.IntegerArray(rank, ~planned),
+            'statut': statut,
+        }, index=data.index)
+
+        p = period[planned]
+        n_par_periode = np.bincount(p, minlength=n_periods)
+        cout_par_periode = np.bincount(p, weights=costs[planned], minlength=n_periods)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            taux = np.where(np.isfinite(budgets), cout_par_periode / np.asarray(budgets), np.nan)
+        synthese = pd.DataFrame({
+            'periode': np.arange(1, n_periods + 1),
+            'interventions': n_par_periode,
+            'cout': cout_par_periode,
+            'budget': budgets,
+            'capacite': capacities,
+            'taux_budget': taux,
+            'score_traite': np.bincount(p, weights=values[planned], minlength=n_periods),
+            'methode': methode,
+        })
+        return plan, synthese
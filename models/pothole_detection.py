@@ -0,0 +1,196 @@
+# pothole_detection.py
+"""
+Détection des nids-de-poule par contours (OpenCV), sur une image ou sur des
+milliers de photos de relevé réparties sur un pool de processus.
+"""
+import json
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from services.perf import timed
+
+# cv2 et pandas sont importés dans les fonctions : charger ce module reste léger
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# Surface (pixels) d'un nid-de-poule à la résolution d'origine
+MIN_AREA = 100
+MAX_AREA = 10000
+
+# À incrémenter si find_potholes change : invalide les résultats mis en cache
+DETECTION_VERSION = 1
+
+_worker_caches = {}  # un AnalysisCache par processus du pool
+
+
+def find_contours(gray):
+    """Contours extérieurs des bords détectés (flou gaussien puis Canny)"""
+    import cv2
+    # Détection des contours
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+
+    # Trouver les contours
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def find_potholes(gray, min_area=MIN_AREA, max_area=MAX_AREA):
+    """Contours candidats d'une image en niveaux de gris"""
+    import cv2
+    # Filtrer les contours (nids-de-poule)
+    potholes = []
+    for contour in find_contours(gray):
+        area = cv2.contourArea(contour)
+        if min_area < area < max_area:  # Taille raisonnable pour un nid-de-poule
+            x, y, w, h = cv2.boundingRect(contour)
+            potholes.append({
+                'position': {'x': x, 'y': y},
+                'dimensions': {'largeur': w, 'hauteur': h},
+                'superficie': area
+            })
+    return potholes
+
+
+def summarize(potholes):
+    return {
+        'nombre_nids_poule': len(potholes),
+        'superficie_totale': sum(p['superficie'] for p in potholes),
+        'details': potholes
+    }
+
+
+@timed('detect_potholes_in_file')
+def detect_potholes_in_file(img_path, max_side=None):
+    """
+    Détecte les nids-de-poule d'une image.
+    Avec max_side, l'image est réduite avant la détection des contours ; les
+    seuils de surface sont mis à l'échelle et les résultats ramenés en
+    coordonnées de l'image d'origine.
+    """
+    import cv2
+    img = cv2.imread(img_path)
+    if img is None:
+        raise ValueError(f"Image illisible : {img_path}")
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return summarize(detect_potholes_in_gray(gray, max_side))
+
+
+def detect_potholes_in_gray(gray, max_side=None):
+    """Nids-de-poule d'une image déjà en niveaux de gris (coordonnées de l'image d'origine)"""
+    import cv2
+    scale = 1.0
+    if max_side and max(gray.shape) > max_side:
+        scale = max_side / max(gray.shape)
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    potholes = find_potholes(gray, MIN_AREA * scale ** 2, MAX_AREA * scale ** 2)
+    if scale != 1.0:
+        for p in potholes:
+            p['position'] = {k: int(round(v / scale)) for k, v in p['position'].items()}
+            p['dimensions'] = {k: int(round(v / scale)) for k, v in p['dimensions'].items()}
+            p['superficie'] = p['superficie'] / scale ** 2
+    return potholes
+
+
+def detection_version(max_side=None):
+    """Version des paramètres de détection (clé du cache de résultats)"""
+    return f"contours-v{DETECTION_VERSION}:{MIN_AREA}-{MAX_AREA}:{max_side}"
+
+
+def detect_potholes_cached(img_path, max_side=None, cache=None):
+    """detect_potholes_in_file, précédé d'une recherche par hash du contenu dans cache"""
+    if cache is None:
+        return detect_potholes_in_file(img_path, max_side)
+    from models.result_cache import image_hash
+    sha = image_hash(img_path)
+    version = detection_version(max_side)
+    result = cache.get('nids_poule', sha, version)
+    if result is None:
+        result = detect_potholes_in_file(img_path, max_side)
+        cache.put('nids_poule', sha, version, result)
+    return result
+
+
+def _detect_worker(img_path, max_side, cache_path=None):
+    # Exécuté dans un processus du pool : les erreurs sont renvoyées, pas levées
+    cache = None
+    if cache_path:
+        if cache_path not in _worker_caches:
+            from models.result_cache import AnalysisCache
+            _worker_caches[cache_path] = AnalysisCache(cache_path)
+        cache = _worker_caches[cache_path]
+    try:
+        result = detect_potholes_cached(img_path, max_side, cache)
+    except Exception as e:
+        return {'image': img_path, 'erreur': str(e)}
+    result['image'] = img_path
+    return result
+
+
+def iter_image_paths(directory):
+    """Chemins des images d'un dossier (récursif), dans un ordre stable"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def detect_potholes_batch(images, workers=None, ordered=True, max_in_flight=None, max_side=None, cache_path=None):
+    """
+    Détection sur un dossier ou un itérable de chemins (générateur de dicts).
+    Au plus max_in_flight images sont en cours à la fois ; ordered=False
+    renvoie les résultats dès qu'ils sont prêts. cache_path : base SQLite des
+    résultats (voir result_cache), partagée par les processus.
+    """
+    paths = iter_image_paths(images) if isinstance(images, str) and os.path.isdir(images) else iter(images)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for path in paths:
+            in_flight.append(pool.submit(_detect_worker, path, max_side, cache_path))
+            if len(in_flight) >= max_in_flight:
+                yield from _collect(in_flight, ordered)
+        while in_flight:
+            yield from _collect(in_flight, ordered)
+
+
+def _collect(in_flight, ordered):
+    """Retire du pool le prochain résultat (ordre d'entrée) ou tous ceux déjà prêts"""
+    if ordered:
+        return [in_flight.popleft().result()]
+    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+    for future in done:
+        in_flight.remove(future)
+    return [future.result() for future in done]
+
+
+def results_to_frame(results):
+    """Une ligne par image ; les contours détaillés sont sérialisés en JSON"""
+    import pandas as pd
+    rows = [{
+        'image': r.get('image'),
+        'nombre_nids_poule': r.get('nombre_nids_poule'),
+        'superficie_totale': r.get('superficie_totale'),
+        'details': json.dumps(r['details']) if 'details' in r else None,
+        'erreur': r.get('erreur'),
+    } for r in results]
+    return pd.DataFrame(rows, columns=['image', 'nombre_nids_poule', 'superficie_totale', 'details', 'erreur'])
+
+
+def write_results(results, output_path):
+    """Écrit tous les résultats en une seule écriture (CSV ou Parquet selon l'extension)"""
+    df = results_to_frame(results)
+    if output_path.lower().endswith('.parquet'):
+        df.to_parquet(output_path, index=False)
+    else:
+        df.to_csv(output_path, index=False)
+    return df
+
+
+def detect_potholes_directory(directory, output_path, **kwargs):
+    """Traite tout un dossier de relevés et écrit le rapport"""
+    return write_results(detect_potholes_batch(directory, **kwargs), output_path)
@@ -1,19 +1,90 @@
+import hashlib
+
 import pandas as pd
 import numpy as np
-import joblib
-import os
+
+from models.registry import get_model, registry
+from services.perf import timed
+
+# Seuils de décision (score minimal, label, action), du plus urgent au moins urgent
+NIVEAUX_PRIORITE = [
+    (60, "🚨 URGENT", "Colmatage immédiat & Renforcement"),
+    (30, "⚠️ Prioritaire", "Planifier réfection (Trimestre 1)"),
+    (0, "✅ Surveillance", "Maintenance préventive standard"),
+]
+
+# À incrémenter à chaque modification des règles A à D (invalide les scores mémorisés)
+RULES_VERSION = 1
+
+# Colonnes lues par les règles : seules leurs valeurs déterminent le score
+SCORING_COLUMNS = [
+    'présence du nid de poule',
+    'classe de voirie',
+    'linéaire de voirie(ml)',
+    'Nombre de point lumineux sur le tronçon',
+]
+
+
+def _colonne_texte(df, colonne):
+    """Équivalent colonne de str(row.get(colonne, '')).strip()"""
+    if colonne not in df.columns:
+        return pd.Series('', index=df.index)
+    # Les cellules vides deviennent 'nan', comme str(nan) dans la version ligne à ligne
+    return df[colonne].astype(object).fillna('nan').astype(str).str.strip()
+
+
+def _colonne_drapeau(df, colonne):
+    """
+    _colonne_texte en minuscules pour le drapeau nid de poule, aussi quand il
+    a été compacté en booléen : False provient d'une cellule vide, lue 'nan'.
+    """
+    if colonne in df.columns and pd.api.types.is_bool_dtype(df[colonne]):
+        return pd.Series(np.where(df[colonne].to_numpy(dtype=bool), 'oui', 'nan'), index=df.index)
+    return _colonne_texte(df, colonne).str.lower()
+
+
+def _colonne_float(df, colonne):
+    """Équivalent colonne du float(row.get(colonne, 0)) avec repli à 0"""
+    if colonne not in df.columns:
+        return np.zeros(len(df))
+    serie = df[colonne]
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy(dtype=float, na_value=np.nan)
+
+    valeurs = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float, na_value=np.nan, copy=True)
+    # Les textes non numériques tombent à 0, les cellules vides restent nan
+    valeurs[np.isnan(valeurs) & serie.notna().to_numpy()] = 0
+    return valeurs
+
 
 class MaintenancePredictor:
     def __init__(self):
-        self.model = None
         self.model_path = 'models/maintenance_model.pkl'
-        
-        # Tentative de chargement du modèle (si vous l'avez entraîné et uploadé)
-        if os.path.exists(self.model_path):
-            try:
-                self.model = joblib.load(self.model_path)
-            except:
-                self.model = None
+
+    @property
+    def model(self):
+        """
+        Modèle entraîné (si vous l'avez entraîné et uploadé), ou None.
+        Chargé une seule fois par processus via le registre partagé, et
+        rechargé automatiquement si le fichier .pkl change.
+        """
+        return get_model(self.model_path)
+
+    @property
+    def version(self):
+        """Empreinte des règles (et du modèle entraîné s'il existe) : clé des scores mémorisés"""
+        parts = [str(RULES_VERSION), repr(NIVEAUX_PRIORITE), registry.digest(self.model_path) or '']
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+    def scoring_inputs(self, df):
+        """Entrées normalisées des règles, telles que vues par predict_priority_batch"""
+        nid_poule, classe, lineaire, lumieres = SCORING_COLUMNS
+        return pd.DataFrame({
+            'nid_poule': _colonne_drapeau(df, nid_poule),
+            'classe': _colonne_texte(df, classe),
+            'lineaire': _colonne_float(df, lineaire),
+            'lumieres': _colonne_float(df, lumieres),
+        }, index=df.index)
 
     def predict_priority(self, row):
         """
@@ -25,7 +96,11 @@ class MaintenancePredictor:
         # On utilise .get() pour éviter les crashs si une colonne manque
         
         # Nettoyage des valeurs (gestion des NaN/Vides)
-        nid_poule = str(row.get('présence du nid de poule', '')).strip().lower()
+        nid_poule = row.get('présence du nid de poule', '')
+        if isinstance(nid_poule, (bool, np.bool_)):
+            # Drapeau compacté (services/dtypes) : False = cellule vide
+            nid_poule = 'oui' if nid_poule else 'nan'
+        nid_poule = str(nid_poule).strip().lower()
         classe = str(row.get('classe de voirie', '')).strip().title()
         
         try:
@@ -65,15 +140,9 @@ class MaintenancePredictor:
         final_score = min(score, 100)
 
         # 3. DÉCISION ET ACTION
-        if final_score >= 60:
-            label = "🚨 URGENT"
-            action = "Colmatage immédiat & Renforcement"
-        elif final_score >= 30:
-            label = "⚠️ Prioritaire"
-            action = "Planifier réfection (Trimestre 1)"
-        else:
-            label = "✅ Surveillance"
-            action = "Maintenance préventive standard"
+        for seuil, label, action in NIVEAUX_PRIORITE:
+            if final_score >= seuil:
+                break
 
         # Retourne le format exact attendu par votre app.py
         return {
@@ -81,4 +150,60 @@ class MaintenancePredictor:
             'score': final_score,
             'action': action,
             'confiance': 100 # Simulé à 100% car basé sur des règles strictes
-        }
\ No newline at end of file
+        }
+
+    @timed('predict_priority_batch')
+    def predict_priority_batch(self, df):
+        """
+        Version vectorisée de predict_priority pour tout un DataFrame.
+        Applique les mêmes règles A à D colonne par colonne et retourne un
+        DataFrame (même index que df) avec les colonnes label, score, action
+        et confiance, identiques à un appel ligne par ligne.
+        """
+        return priority_frame(*self.predict_levels(df), df.index)
+
+    def predict_levels(self, df):
+        """(indice de niveau dans NIVEAUX_PRIORITE, score, confiance) de chaque ligne, en tableaux"""
+        inputs = self.scoring_inputs(df)
+        nid_poule = inputs['nid_poule']
+        classe = inputs['classe'].str.title()
+        lineaire = inputs['lineaire'].to_numpy()
+        lumieres = inputs['lumieres'].to_numpy()
+
+        score = np.zeros(len(df), dtype=int)
+
+        # Règle A : Présence de nid de poule (toute valeur non vide)
+        score += np.where(nid_poule.str.len().to_numpy() > 0, 50, 0)
+
+        # Règle B : Importance de la route
+        primaire = classe.str.contains('Primaire', regex=False).to_numpy(dtype=bool)
+        secondaire = classe.str.contains('Secondaire', regex=False).to_numpy(dtype=bool)
+        score += np.where(primaire, 20, np.where(secondaire, 10, 0))
+
+        # Règle C : Sécurité / Éclairage
+        score += np.where((lineaire > 500) & (lumieres < 5), 15, 0)
+
+        # Règle D : Taille du tronçon
+        score += np.where(lineaire > 2000, 10, 0)
+
+        final_score = np.minimum(score, 100)
+
+        # Indice du premier niveau dont le seuil est atteint
+        conditions = [final_score >= seuil for seuil, _, _ in NIVEAUX_PRIORITE]
+        niveau = np.select(conditions, np.arange(len(NIVEAUX_PRIORITE)))
+        return niveau, final_score, np.full(len(df), 100)
+
+
+def priority_frame(niveau, score, confiance, index):
+    """
+    Prédictions au format de predict_priority_batch (label, score, action,
+    confiance) à partir des indices de niveau dans NIVEAUX_PRIORITE.
+    """
+    labels = np.array([label for _, label, _ in NIVEAUX_PRIORITE], dtype=object)
+    actions = np.array([action for _, _, action in NIVEAUX_PRIORITE], dtype=object)
+    return pd.DataFrame({
+        'label': labels[niveau],
+        'score': score,
+        'action': actions[niveau],
+        'confiance': confiance
+    }, index=index)
@@ -0,0 +1,144 @@
+# registry.py
+"""
+Registre des modèles partagé par tout le processus.
+
+Chaque fichier (.pkl joblib) est chargé une seule fois, quel que soit le
+nombre de sessions Streamlit ; les gros tableaux NumPy sont mappés en
+mémoire (mmap_mode) plutôt que copiés. Le modèle est rechargé à chaud quand
+la date de modification du fichier change et que son contenu (hash) diffère.
+La taille rapportée est celle des tableaux du modèle (en mémoire / mappés).
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def array_nbytes(obj, max_depth=8):
+    """
+    Octets des tableaux NumPy du modèle : (en mémoire, mappés depuis le fichier).
+    Parcourt les attributs, listes, tuples et dicts (estimateurs imbriqués compris).
+    """
+    seen = set()
+    totals = [0, 0]
+
+    def visit(value, depth):
+        if depth > max_depth or id(value) in seen:
+            return
+        seen.add(id(value))
+        if isinstance(value, np.ndarray):
+            base = value if value.base is None else value.base
+            totals[1 if isinstance(value, np.memmap) or isinstance(base, np.memmap) else 0] += value.nbytes
+        elif isinstance(value, dict):
+            for item in value.values():
+                visit(item, depth + 1)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                visit(item, depth + 1)
+        elif hasattr(value, '__dict__') and not isinstance(value, type):
+            visit(vars(value), depth + 1)
+        elif type(value).__module__.startswith('sklearn'):
+            # Objets compilés (arbres sklearn) : tableaux exposés par __getstate__
+            visit(value.__getstate__(), depth + 1)
+
+    visit(obj, 0)
+    return totals[0], totals[1]
+
+
+class ModelRegistry:
+    def __init__(self, mmap_mode='r'):
+        self.mmap_mode = mmap_mode
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path):
+        import joblib  # import différé (voir models/__init__)
+
+        start = time.perf_counter()
+        model = joblib.load(path, mmap_mode=self.mmap_mode)
+        elapsed = time.perf_counter() - start
+        # Taille des tableaux du modèle, sans tracemalloc (global au processus, réservé aux benchmarks)
+        memory, mapped = array_nbytes(model)
+        return model, elapsed, memory, mapped
+
+    def get(self, path):
+        """Modèle chargé depuis path (None si le fichier est absent ou illisible)"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry['signature'] == signature:
+                entry['hits'] += 1
+                return entry['model']
+
+            digest = file_hash(path)
+            if entry and entry['sha256'] == digest:
+                # Fichier touché mais contenu identique : pas de rechargement
+                entry['signature'] = signature
+                entry['hits'] += 1
+                return entry['model']
+
+            try:
+                model, elapsed, memory, mapped = self._load(path)
+                erreur = None
+            except Exception as e:
+                # Fichier illisible : mémorisé jusqu'à sa prochaine modification
+                model, elapsed, memory, mapped, erreur = None, None, None, None, str(e)
+            self._entries[path] = {
+                'model': model,
+                'signature': signature,
+                'sha256': digest,
+                'load_time': elapsed,
+                'memory_bytes': memory,
+                'mapped_bytes': mapped,
+                'loaded_at': time.time(),
+                'loads': (entry['loads'] + 1) if entry else 1,
+                'hits': 0,
+                'erreur': erreur,
+            }
+            return model
+
+    def digest(self, path):
+        """sha256 du fichier actuellement chargé (None s'il est absent ou illisible)"""
+        if self.get(path) is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            return entry['sha256'] if entry else None
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        """Temps de chargement, mémoire et compteurs par fichier"""
+        with self._lock:
+            return [
+                {'path': path, **{k: v for k, v in entry.items() if k not in ('model', 'signature')}}
+                for path, entry in self._entries.items()
+            ]
+
+
+registry = ModelRegistry()
+
+
+def get_model(path):
+    return registry.get(path)
@@ -1,43 +1,130 @@
 # resource_optimization.py
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+
+from services.perf import timed
+
+LIGHTING_FEATURES = ['linéaire_ml', 'points_lumineux', 'traffic_estimate']
+
+DEGRADATION_RATE = 0.05  # 5% de dégradation par an
+
+
+def _cluster_means(labels, values, n_clusters):
+    """Moyenne par cluster en une passe bincount (les NaN sont ignorés, comme pandas)"""
+    valid = ~np.isnan(values)
+    sums = np.bincount(labels[valid], weights=values[valid], minlength=n_clusters)
+    counts = np.bincount(labels[valid], minlength=n_clusters)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
 
 class UrbanResourceOptimizer:
     def __init__(self):
+        # sklearn n'est chargé qu'à la création de l'optimiseur
+        from sklearn.preprocessing import StandardScaler
         self.scaler = StandardScaler()
+        self.kmeans = None  # centroïdes conservés entre deux appels
+        self._scaler_fitted = False
     
-    def optimize_lighting(self, data):
-        """Optimise l'éclairage public"""
+    def _fit_scaler(self, features, chunk_size):
+        from sklearn.preprocessing import StandardScaler
+        self.scaler = StandardScaler()
+        for start in range(0, len(features), chunk_size):
+            self.scaler.partial_fit(features[start:start + chunk_size])
+        self._scaler_fitted = True
+    
+    def choose_n_clusters(self, features_scaled, k_range=range(2, 9), sample_size=5000):
+        """Choix automatique de k (silhouette sur un échantillon)"""
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.metrics import silhouette_score
+        
+        rng = np.random.default_rng(42)
+        sample = features_scaled
+        if len(sample) > sample_size:
+            sample = sample[rng.choice(len(sample), sample_size, replace=False)]
+        
+        best_k, best_score = None, -np.inf
+        for k in k_range:
+            if k >= len(sample):
+                break
+            labels = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3).fit_predict(sample)
+            if len(np.unique(labels)) < 2:
+                continue
+            score = silhouette_score(sample, labels)
+            if score > best_score:
+                best_k, best_score = k, score
+        return best_k or 3
+    
+    @timed('optimize_lighting')
+    def optimize_lighting(self, data, scalable=False, n_clusters=3, auto_k=False, chunk_size=10000, refit=True):
+        """
+        Optimise l'éclairage public.
+        scalable=True : MiniBatchKMeans entraîné par partial_fit sur des blocs
+        de chunk_size lignes (jeux de données nationaux).
+        auto_k=True : nombre de clusters choisi automatiquement.
+        refit=False : réutilise le scaler et les centroïdes du dernier appel.
+        Les clusters vides (possibles avec MiniBatchKMeans) sont omis : la liste
+        peut compter moins de n_clusters recommandations (l'ancienne boucle
+        sur range(3) échouait sur la moyenne NaN d'un cluster vide).
+        """
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+        
         # Regroupement des tronçons par similarité
-        features = data[['linéaire_ml', 'points_lumineux', 'traffic_estimate']].values
-        features_scaled = self.scaler.fit_transform(features)
+        features = data[LIGHTING_FEATURES].to_numpy(dtype=float)
+        
+        reuse = not refit and self._scaler_fitted and self.kmeans is not None
+        if not reuse:
+            if scalable:
+                self._fit_scaler(features, chunk_size)
+            else:
+                self.scaler.fit(features)
+                self._scaler_fitted = True
+        features_scaled = self.scaler.transform(features)
         
         # Clustering pour regrouper les tronçons similaires
-        kmeans = KMeans(n_clusters=3, random_state=42)
-        clusters = kmeans.fit_predict(features_scaled)
+        if not reuse:
+            if auto_k:
+                n_clusters = self.choose_n_clusters(features_scaled)
+            if scalable:
+                # Un seul départ : n_init n'est pas appliqué par partial_fit
+                self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=min(chunk_size, 4096))
+                for start in range(0, len(features_scaled), chunk_size):
+                    self.kmeans.partial_fit(features_scaled[start:start + chunk_size])
+            else:
+                self.kmeans = KMeans(n_clusters=n_clusters, random_state=42).fit(features_scaled)
+        n_clusters = self.kmeans.n_clusters
+        clusters = self.kmeans.predict(features_scaled)
+        
+        # Statistiques de tous les clusters en une passe
+        counts = np.bincount(clusters, minlength=n_clusters)
+        avg_lights_all = _cluster_means(clusters, data['points_lumineux'].to_numpy(dtype=float), n_clusters)
+        avg_length_all = _cluster_means(clusters, data['linéaire_ml'].to_numpy(dtype=float), n_clusters)
+        # Noms des tronçons regroupés par cluster (tri stable puis découpage)
+        order = np.argsort(clusters, kind='stable')
+        targets = np.split(data['tronçon de voirie'].to_numpy(dtype=object)[order], np.cumsum(counts)[:-1])
         
         # Recommandations par cluster
         recommendations = []
-        for i in range(3):
-            cluster_data = data[clusters == i]
-            avg_lights = cluster_data['points_lumineux'].mean()
-            avg_length = cluster_data['linéaire_ml'].mean()
+        for i in range(n_clusters):
+            if counts[i] == 0:
+                continue
+            avg_lights = avg_lights_all[i]
+            avg_length = avg_length_all[i]
             
             # Calcul de l'éclairage optimal
             optimal_lights = max(10, int(avg_length / 30))  # 1 point tous les 30m
             
             recommendations.append({
                 'cluster': i,
-                'troncons': len(cluster_data),
+                'troncons': int(counts[i]),
                 'eclairage_actuel_moyen': avg_lights,
                 'eclairage_recommande': optimal_lights,
                 'economie_potentielle': avg_lights - optimal_lights,
-                'troncons_cibles': cluster_data['tronçon de voirie'].tolist()
+                'troncons_cibles': targets[i].tolist()
             })
         
         return recommendations
     
+    @timed('predict_infrastructure_degradation')
     def predict_infrastructure_degradation(self, data):
         """Prédit la dégradation future des infrastructures"""
         # Simple modèle linéaire pour l'exemple
@@ -60,4 +147,70 @@ class UrbanResourceOptimizer:
                 'annee_recommandee': 2024 + (3 if priority == 'Haute' else 5)
             })
         
-        return predictions
\ No newline at end of file
+        return predictions
+    
+    @timed('project_degradation')
+    def project_degradation(self, data, horizons=range(1, 31), rates=None, class_column='classe de voirie',
+                            default_rate=DEGRADATION_RATE, base_year=2024, priority_horizon=3, return_states=False):
+        """
+        Projection vectorisée de l'état de chaque tronçon sur plusieurs horizons.
+        L'état projeté est calculé d'un bloc (tronçons x années) par broadcast.
+        horizons : années depuis base_year, triées par ordre croissant ici.
+        rates : taux annuel par classe de voirie, ex. {'Primaire': 0.04}.
+        annee_recommandee est la première année où l'état passe sous 0.5
+        (<NA> si jamais dans les horizons) — et non plus base_year + 3 / + 5
+        selon la priorité, comme dans predict_infrastructure_degradation.
+        Retourne un DataFrame (une colonne par indicateur) et, si
+        return_states, la matrice float32 des états projetés (une colonne
+        par horizon, dans l'ordre croissant).
+        """
+        import pandas as pd
+        
+        n = len(data)
+        # Tri nécessaire : la première année sous un seuil est lue par argmax le long des horizons
+        years = np.sort(np.asarray(list(horizons), dtype=np.float32))
+        if not len(years):
+            raise ValueError("Aucun horizon de projection")
+        
+        if 'etat_actuel' in data.columns:
+            current = pd.to_numeric(data['etat_actuel'], errors='coerce').to_numpy(dtype=np.float32)  # 0-1, 1 = parfait
+        else:
+            current = np.full(n, 0.8, dtype=np.float32)
+        
+        rate = np.full(n, default_rate, dtype=np.float32)
+        if rates and class_column in data.columns:
+            classe = data[class_column].astype(object).fillna('').astype(str).str.strip().str.title()
+            mapped = classe.map({str(k).strip().title(): v for k, v in rates.items()}).to_numpy(dtype=np.float32)
+            rate = np.where(np.isnan(mapped), rate, mapped).astype(np.float32)
+        
+        # etat(t) = etat_actuel * (1 - taux) ** t, pour toutes les années à la fois
+        states = current[:, None] * np.exp(years[None, :] * np.log1p(-rate)[:, None])
+        
+        # Première année sous chaque seuil (l'état ne fait que décroître)
+        def first_year_below(threshold):
+            below = states < threshold
+            year = base_year + years[below.argmax(axis=1)].astype(np.int64)
+            return pd.arrays.IntegerArray(year, ~below.any(axis=1))  # <NA> si jamais atteint
+        
+        annee_critique = first_year_below(0.5)
+        annee_moyenne = first_year_below(0.7)
+        
+        if priority_horizon in years:
+            etat_horizon = states[:, int(np.flatnonzero(years == priority_horizon)[0])]
+        else:
+            etat_horizon = current * np.exp(priority_horizon * np.log1p(-rate))
+        priority = np.where(etat_horizon < 0.5, 'Haute', np.where(etat_horizon < 0.7, 'Moyenne', 'Basse'))
+        
+        result = pd.DataFrame({
+            'troncon': data['tronçon de voirie'].to_numpy() if 'tronçon de voirie' in data.columns else np.arange(n),
+            'etat_actuel': current,
+            'taux_degradation': rate,
+            f'etat_pred_{priority_horizon}_ans': etat_horizon,
+            'priorite_intervention': priority,
+            'annee_seuil_moyen': annee_moyenne,
+            'annee_recommandee': annee_critique,
+        }, index=data.index)
+        
+        if return_states:
+            return result, states
+        return result
@@ -0,0 +1,90 @@
+# result_cache.py
+"""
+Cache persistant (SQLite) des résultats d'analyse d'images.
+
+Clé : hash du contenu de l'image + type d'analyse + version (hash du modèle
+et paramètres). Le cache est consulté avant tout décodage : ré-analyser un
+dossier de relevés déjà traité ne coûte que la lecture et le hash des
+fichiers. Plusieurs détecteurs (modèles ou moteurs différents) partagent la
+même base : les versions périmées ne sont purgées que sur demande
+(RoadDefectDetector.purge_cache).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from models.registry import file_hash
+
+DEFAULT_CACHE_PATH = 'data/cache/analyses.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resultats (
+    analyse TEXT NOT NULL,
+    image_sha256 TEXT NOT NULL,
+    version TEXT NOT NULL,
+    resultat TEXT NOT NULL,
+    cree_le REAL NOT NULL,
+    PRIMARY KEY (analyse, image_sha256, version)
+)
+"""
+
+
+def image_hash(img_path):
+    """sha256 du contenu du fichier (indépendant de son nom et de sa date)"""
+    return file_hash(img_path)
+
+
+class AnalysisCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        # Une connexion partagée par les threads du processus, protégée par le verrou
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')  # lecteurs et écrivain concurrents (pools de processus)
+            self._conn.execute(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, analyse, image_sha256, version):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT resultat FROM resultats WHERE analyse = ? AND image_sha256 = ? AND version = ?',
+                (analyse, image_sha256, version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, analyse, image_sha256, version, resultat):
+        payload = json.dumps(resultat)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO resultats VALUES (?, ?, ?, ?, ?)',
+                (analyse, image_sha256, version, payload, time.time()),
+            )
+
+    def purge(self, analyse, keep_versions):
+        """Supprime les résultats d'une analyse calculés avec une autre version (une ou plusieurs à garder)"""
+        keep = [keep_versions] if isinstance(keep_versions, str) else list(keep_versions)
+        placeholders = ', '.join('?' * len(keep)) or "''"
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f'DELETE FROM resultats WHERE analyse = ? AND version NOT IN ({placeholders})', (analyse, *keep)
+            ).rowcount
+
+    def stats(self):
+        with self._lock:
+            n = self._conn.execute('SELECT COUNT(*) FROM resultats').fetchone()[0]
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'taux_hits': self.hits / total if total else 0.0, 'entrees': n}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,352 @@
+# tiled_detection.py
+"""
+Détection des nids-de-poule par tuiles, pour les très grandes images
+(orthophotos de drone, panoramas de voirie assemblés).
+
+L'image n'est jamais chargée en entier :
+- formats non compressés (.npy, BMP, PGM/PPM, TIFF à bandes) : projection en
+  mémoire (np.memmap), chaque tuile ne lit que ses octets ;
+- autres formats : un seul décodage, seule l'image en niveaux de gris étant conservée.
+
+Les tuiles se chevauchent et sont traitées en parallèle par un pool de
+threads (OpenCV libère le GIL), au plus max_in_flight à la fois. Chaque
+contour appartient à la tuile qui contient le centre de son rectangle ; les
+contours coupés par un bord de tuile sont fusionnés en re-détectant la
+fenêtre qui regroupe leurs fragments. Les résultats sont en coordonnées de
+l'image entière, les seuils de surface ramenés à sa résolution au sol.
+
+    python -m models.tiled_detection orthophoto.tif --gsd 0.03 -o nids_poule.json
+"""
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from models.pothole_detection import MAX_AREA, MIN_AREA, find_contours, summarize
+from services.perf import timed
+
+TILE_SIZE = 2048
+
+# Résolution au sol (m/pixel) des photos de relevé pour laquelle MIN_AREA / MAX_AREA sont définis
+REFERENCE_GSD_M = 0.01
+
+# Bande (pixels) le long d'un bord de tuile où le flou et Canny diffèrent de l'image entière
+EDGE_MARGIN = 3
+
+
+# ---------- Lecture par tuiles ----------
+class ArrayRaster:
+    """Image (H, W) ou (H, W, C) lue par fenêtres, convertie en niveaux de gris à la demande"""
+
+    _GRAY_CODES = {('bgr', 3): 'COLOR_BGR2GRAY', ('bgr', 4): 'COLOR_BGRA2GRAY',
+                   ('rgb', 3): 'COLOR_RGB2GRAY', ('rgb', 4): 'COLOR_RGBA2GRAY'}
+
+    def __init__(self, array, order='bgr', lecture='memmap'):
+        self.array = array
+        self.order = order
+        self.lecture = lecture
+        self.height, self.width = array.shape[:2]
+
+    def read_gray(self, y0, y1, x0, x1):
+        import cv2
+        tile = np.ascontiguousarray(self.array[y0:y1, x0:x1])
+        if tile.ndim == 2:
+            return tile
+        return cv2.cvtColor(tile, getattr(cv2, self._GRAY_CODES[(self.order, tile.shape[2])]))
+
+
+def _memmap_bmp(path):
+    with open(path, 'rb') as f:
+        header = f.read(54)
+    if len(header) < 54 or header[:2] != b'BM':
+        return None
+    offset, = struct.unpack_from('<I', header, 10)
+    width, height, _, bpp, compression = struct.unpack_from('<iiHHI', header, 18)
+    if compression != 0 or bpp not in (24, 32) or width <= 0 or height == 0:
+        return None
+    channels = bpp // 8
+    stride = (width * bpp + 31) // 32 * 4  # lignes alignées sur 4 octets
+    rows = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(abs(height), stride))
+    array = rows[:, :width * channels].reshape(abs(height), width, channels)
+    # Hauteur positive : lignes stockées de bas en haut
+    return ArrayRaster(array[::-1] if height > 0 else array, order='bgr')
+
+
+_PNM_TOKEN = re.compile(rb'(?:\s|#[^\n]*\n)*(\d+)')
+
+
+def _memmap_pnm(path):
+    with open(path, 'rb') as f:
+        head = f.read(1024)
+    if head[:2] not in (b'P5', b'P6'):
+        return None
+    values, pos = [], 2
+    for _ in range(3):
+        match = _PNM_TOKEN.match(head, pos)
+        if match is None:
+            return None
+        values.append(int(match.group(1)))
+        pos = match.end()
+    width, height, maxval = values
+    if maxval > 255:
+        return None
+    shape = (height, width) if head[:2] == b'P5' else (height, width, 3)
+    # Un seul blanc sépare l'en-tête des données
+    return ArrayRaster(np.memmap(path, dtype=np.uint8, mode='r', offset=pos + 1, shape=shape), order='rgb')
+
+
+_TIFF_TYPES = {1: 'B', 3: 'H', 4: 'I'}
+
+
+def _tiff_tags(f, endian):
+    f.seek(4)
+    ifd, = struct.unpack(endian + 'I', f.read(4))
+    f.seek(ifd)
+    n, = struct.unpack(endian + 'H', f.read(2))
+    tags = {}
+    for _ in range(n):
+        tag, kind, count, raw = struct.unpack(endian + 'HHI4s', f.read(12))
+        code = _TIFF_TYPES.get(kind)
+        if code is None:
+            continue
+        size = struct.calcsize(code) * count
+        if size > 4:
+            # Valeurs hors de l'entrée : raw est leur position dans le fichier
+            pos = f.tell()
+            f.seek(struct.unpack(endian + 'I', raw)[0])
+            raw = f.read(size)
+            f.seek(pos)
+        tags[tag] = struct.unpack(endian + code * count, raw[:size])
+    return tags
+
+
+def _memmap_tiff(path):
+    """TIFF 8 bits non compressé, à bandes contiguës (sinon None)"""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+        if magic not in (b'II*\x00', b'MM\x00*'):
+            return None
+        tags = _tiff_tags(f, '<' if magic[:2] == b'II' else '>')
+    width, height = tags.get(256, (0,))[0], tags.get(257, (0,))[0]
+    samples = tags.get(277, (1,))[0]
+    offsets, counts = tags.get(273), tags.get(279)
+    if (not width or not height or not offsets or not counts
+            or tags.get(259, (1,))[0] != 1              # compression
+            or set(tags.get(258, (8,))) != {8}          # bits par canal
+            or tags.get(262, (1,))[0] not in (1, 2)     # niveaux de gris ou RVB
+            or samples not in (1, 3, 4)
+            or (samples > 1 and tags.get(284, (1,))[0] != 1)  # canaux entrelacés
+            or 322 in tags):                            # TIFF en tuiles
+        return None
+    if any(o + c != nxt for o, c, nxt in zip(offsets, counts, offsets[1:])):
+        return None
+    if sum(counts) < width * height * samples:
+        return None
+    shape = (height, width, samples) if samples > 1 else (height, width)
+    return ArrayRaster(np.memmap(path, dtype=np.uint8, mode='r', offset=offsets[0], shape=shape), order='rgb')
+
+
+def open_raster(img_path):
+    """ArrayRaster projeté en mémoire si le format le permet, sinon décodé en niveaux de gris"""
+    ext = os.path.splitext(img_path)[1].lower()
+    if ext == '.npy':
+        # Convention OpenCV (BGR), comme cv2.imread
+        return ArrayRaster(np.load(img_path, mmap_mode='r'), order='bgr')
+    opener = {'.bmp': _memmap_bmp, '.pgm': _memmap_pnm, '.ppm': _memmap_pnm, '.pnm': _memmap_pnm,
+              '.tif': _memmap_tiff, '.tiff': _memmap_tiff}.get(ext)
+    raster = opener(img_path) if opener else None
+    if raster is not None:
+        return raster
+    import cv2
+    img = cv2.imread(img_path)
+    if img is None:
+        raise ValueError(f"Image illisible : {img_path}")
+    # Même conversion que detect_potholes_in_file (IMREAD_GRAYSCALE donne d'autres niveaux) ;
+    # seule l'image en niveaux de gris est conservée
+    return ArrayRaster(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), lecture='decodage')
+
+
+# ---------- Découpage et détection ----------
+def area_thresholds(gsd_m=None):
+    """Seuils de surface (pixels) à la résolution gsd_m (m/pixel) ; sans gsd_m, ceux des photos de relevé"""
+    factor = (REFERENCE_GSD_M / gsd_m) ** 2 if gsd_m else 1.0
+    return MIN_AREA * factor, MAX_AREA * factor
+
+
+def default_overlap(max_area):
+    """Débord des tuiles : un nid-de-poule de surface max_area, même allongé, y tient en entier"""
+    return max(32, int(np.ceil(2 * np.sqrt(max_area))))
+
+
+def tile_grid(height, width, tile_size, overlap):
+    """Tuiles (cœur, fenêtre lue) : les cœurs partitionnent l'image, les fenêtres débordent de overlap"""
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+            yield (y0, y1, x0, x1), (max(0, y0 - overlap), min(height, y1 + overlap),
+                                     max(0, x0 - overlap), min(width, x1 + overlap))
+
+
+def _truncated(window, x, y, w, h, height, width):
+    """Le contour touche un bord de la fenêtre intérieur à l'image : il peut y être coupé"""
+    y0, y1, x0, x1 = window
+    return ((y0 > 0 and y - EDGE_MARGIN < y0) or (x0 > 0 and x - EDGE_MARGIN < x0)
+            or (y1 < height and y + h + EDGE_MARGIN > y1) or (x1 < width and x + w + EDGE_MARGIN > x1))
+
+
+def _owner_window(x, y, w, h, tile_size, overlap, height, width):
+    """Fenêtre de la tuile dont le cœur contient le centre du rectangle"""
+    ty = (y + h // 2) // tile_size * tile_size
+    tx = (x + w // 2) // tile_size * tile_size
+    return (max(0, ty - overlap), min(height, ty + tile_size + overlap),
+            max(0, tx - overlap), min(width, tx + tile_size + overlap))
+
+
+def _detect_window(raster, window):
+    """Contours de la fenêtre : (x, y, largeur, hauteur, surface) en coordonnées globales"""
+    import cv2
+    y0, y1, x0, x1 = window
+    found = []
+    for contour in find_contours(raster.read_gray(y0, y1, x0, x1)):
+        x, y, w, h = cv2.boundingRect(contour)
+        found.append((x + x0, y + y0, w, h, cv2.contourArea(contour)))
+    return found
+
+
+def _pothole(x, y, w, h, area):
+    return {'position': {'x': int(x), 'y': int(y)}, 'dimensions': {'largeur': int(w), 'hauteur': int(h)},
+            'superficie': float(area)}
+
+
+def _process_tile(raster, window, thresholds, tile_size, overlap):
+    """Nids-de-poule entiers possédés par la tuile, et rectangles des contours coupés"""
+    height, width = raster.height, raster.width
+    min_area, max_area = thresholds
+    potholes, fragments = [], []
+    for x, y, w, h, area in _detect_window(raster, window):
+        if _truncated(window, x, y, w, h, height, width):
+            fragments.append((x, y, w, h))
+        elif _owner_window(x, y, w, h, tile_size, overlap, height, width) == window and min_area < area < max_area:
+            potholes.append(_pothole(x, y, w, h, area))
+    return potholes, fragments
+
+
+def merge_windows(fragments, height, width, overlap, max_side):
+    """
+    Fenêtres à re-détecter : les fragments proches sont regroupés sur une
+    grille grossière, chaque groupe élargi de overlap. Les groupes de plus de
+    max_side pixels de côté (bords de chaussée, ombres) sont ignorés.
+    """
+    from scipy import ndimage
+
+    cell = max(overlap // 2, 1)
+    grid = np.zeros((-(-height // cell), -(-width // cell)), dtype=bool)
+    skipped = 0
+    for x, y, w, h in fragments:
+        if w > max_side or h > max_side:
+            skipped += 1
+            continue
+        grid[y // cell:(y + h) // cell + 1, x // cell:(x + w) // cell + 1] = True
+    labels, _ = ndimage.label(grid)
+    windows = []
+    for rows, cols in ndimage.find_objects(labels):
+        window = (max(0, rows.start * cell - overlap), min(height, rows.stop * cell + overlap),
+                  max(0, cols.start * cell - overlap), min(width, cols.stop * cell + overlap))
+        if window[1] - window[0] > max_side or window[3] - window[2] > max_side:
+            skipped += 1
+            continue
+        windows.append(window)
+    return windows, skipped
+
+
+@timed('detect_potholes_tiled')
+def detect_potholes_tiled(img_path, tile_size=TILE_SIZE, overlap=None, gsd_m=None, workers=None,
+                          max_in_flight=None, max_merge_side=None):
+    """
+    Détection par tuiles d'une image de taille quelconque (même résultat que
+    detect_potholes_in_file, en coordonnées de l'image entière).
+    gsd_m : résolution au sol (m/pixel), met à l'échelle les seuils de surface ;
+    overlap : débord des tuiles (par défaut selon la surface maximale) ;
+    max_merge_side : côté maximal d'une fenêtre de fusion (4 tuiles par défaut).
+    """
+    raster = open_raster(img_path) if isinstance(img_path, str) else img_path
+    height, width = raster.height, raster.width
+    thresholds = area_thresholds(gsd_m)
+    overlap = default_overlap(thresholds[1]) if overlap is None else overlap
+    max_merge_side = max_merge_side or 4 * tile_size
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+
+    potholes, fragments, n_tiles = [], [], 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Au plus max_in_flight tuiles en mémoire à la fois
+        in_flight = deque()
+        for _, window in tile_grid(height, width, tile_size, overlap):
+            in_flight.append(pool.submit(_process_tile, raster, window, thresholds, tile_size, overlap))
+            n_tiles += 1
+            while len(in_flight) >= max_in_flight or (in_flight and in_flight[0].done()):
+                found, cut = in_flight.popleft().result()
+                potholes.extend(found)
+                fragments.extend(cut)
+        for future in in_flight:
+            found, cut = future.result()
+            potholes.extend(found)
+            fragments.extend(cut)
+
+        # Contours coupés : re-détectés sur la fenêtre qui regroupe leurs fragments
+        windows, skipped = merge_windows(fragments, height, width, overlap, max_merge_side)
+        seen = set()
+        for window, found in zip(windows, pool.map(lambda w: _detect_window(raster, w), windows)):
+            for x, y, w, h, area in found:
+                owner = _owner_window(x, y, w, h, tile_size, overlap, height, width)
+                if (_truncated(window, x, y, w, h, height, width)
+                        or not _truncated(owner, x, y, w, h, height, width)  # déjà trouvé entier par sa tuile
+                        or (x, y, w, h) in seen):
+                    continue
+                seen.add((x, y, w, h))
+                if thresholds[0] < area < thresholds[1]:
+                    potholes.append(_pothole(x, y, w, h, area))
+
+    potholes.sort(key=lambda p: (p['position']['y'], p['position']['x']))
+    result = summarize(potholes)
+    result.update({
+        'image_taille': {'largeur': width, 'hauteur': height},
+        'tuiles': n_tiles,
+        'fenetres_fusion': len(windows),
+        'fusions_ignorees': skipped,
+        'lecture': raster.lecture,
+        'seuils_surface': list(thresholds),
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Détection des nids-de-poule par tuiles sur une très grande image")
+    parser.add_argument('image')
+    parser.add_argument('-o', '--output', help="fichier JSON des résultats (par défaut : sortie standard)")
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE)
+    parser.add_argument('--overlap', type=int, default=None)
+    parser.add_argument('--gsd', type=float, default=None, help="résolution au sol (m/pixel)")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    result = detect_potholes_tiled(args.image, args.tile_size, args.overlap, args.gsd, args.workers)
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+    print(f"{result['nombre_nids_poule']} nids-de-poule, {result['tuiles']} tuiles "
+          f"({result['lecture']}), {result['fenetres_fusion']} fenêtres de fusion", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
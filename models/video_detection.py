@@ -0,0 +1,365 @@
+# video_detection.py
+"""
+Détection des nids-de-poule en continu sur les vidéos embarquées (dashcam).
+
+Les images sont décodées par un thread lecteur dans une file bornée :
+la mémoire ne dépend pas de la durée de la vidéo. Avant toute détection, une
+vignette de chaque image est comparée à celle de la dernière image
+analysée :
+- quasi-doublon (véhicule à l'arrêt) : l'image est ignorée ;
+- pas d'images adaptatif : il s'allonge quand la scène change peu et se
+  raccourcit quand elle change vite ou que les nids-de-poule suivis se
+  déplacent trop d'une image analysée à l'autre (en mode temps réel, il
+  s'allonge aussi quand le traitement prend du retard sur la vidéo).
+
+Les détections sont suivies d'une image analysée à l'autre (centres
+proches, surfaces comparables) : un nid-de-poule vu sur plusieurs images
+n'est compté qu'une fois.
+
+    python -m models.video_detection trajet.mp4 -o nids_poule.json
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from models.pothole_detection import detect_potholes_in_gray
+from services.perf import timed
+
+# Côté maximal des images analysées (les seuils de surface suivent la réduction)
+VIDEO_MAX_SIDE = 640
+
+# Vignette de comparaison entre images
+THUMBNAIL_SIZE = (64, 36)
+
+# Quasi-doublon : au plus DUPLICATE_FRACTION des pixels de la vignette ont changé de plus de
+# DUPLICATE_PIXEL_DELTA niveaux (un petit objet qui se déplace suffit à l'en exclure)
+DUPLICATE_PIXEL_DELTA = 8
+DUPLICATE_FRACTION = 0.001
+# Écart moyen de vignette (niveaux de gris, 0-255) visé entre deux images analysées :
+# le pas s'adapte autour de cette valeur
+TARGET_CHANGE = 12.0
+# Déplacement maximal (part de la hauteur d'image) d'un nid-de-poule suivi entre deux images
+# analysées : au-delà, le pas est réduit pour ne pas perdre les pistes
+MAX_STEP_MOTION = 0.15
+MAX_STRIDE = 8
+
+
+def thumbnail(gray):
+    import cv2
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def frame_change(a, b, pixel_delta=DUPLICATE_PIXEL_DELTA):
+    """Écart moyen absolu entre deux vignettes et part des pixels ayant changé de plus de pixel_delta"""
+    diff = np.abs(a - b)
+    return float(diff.mean()), np.count_nonzero(diff > pixel_delta) / diff.size
+
+
+class FrameReader:
+    """
+    Images (rang, temps en s, niveaux de gris, vignette) d'une vidéo,
+    décodées par un thread dans une file d'au plus prefetch images.
+    stride peut être modifié pendant la lecture : les images intermédiaires
+    sont sautées par grab(), sans conversion.
+    """
+
+    def __init__(self, video_path, prefetch=8):
+        self.video_path = video_path
+        self.prefetch = prefetch
+        self.stride = 1
+        self.fps = None
+        self.frame_count = None
+        self.frames_read = 0
+
+    def _open(self):
+        import cv2
+        capture = cv2.VideoCapture(self.video_path)
+        if not capture.isOpened():
+            raise ValueError(f"Vidéo illisible : {self.video_path}")
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        return capture
+
+    def _produce(self, capture, frames, stop):
+        import cv2
+        index, next_index = -1, 0
+        try:
+            while not stop.is_set():
+                if not capture.grab():
+                    break
+                index += 1
+                self.frames_read += 1
+                if index < next_index:
+                    continue
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+                item = (index, index / self.fps, gray, thumbnail(gray))
+                while not stop.is_set():
+                    try:
+                        frames.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                next_index = index + max(int(self.stride), 1)
+        except Exception as e:
+            frames.put(e)
+        finally:
+            capture.release()
+            frames.put(None)
+
+    def __iter__(self):
+        capture = self._open()
+        frames = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(capture, frames, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = frames.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consommateur interrompu : le lecteur s'arrête et libère la vidéo
+            stop.set()
+            while producer.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+
+
+class PotholeTracker:
+    """
+    Regroupe les détections successives d'un même nid-de-poule.
+    Chaque piste prédit la position de son centre à vitesse constante (vitesse
+    mesurée entre ses deux dernières observations). Une détection prolonge la
+    piste dont la prédiction est la plus proche si l'écart reste sous
+    min_radius + velocity_tolerance x déplacement prédit (piste sans vitesse
+    connue : max_motion diagonales d'image par seconde écoulée) et si sa
+    surface reste dans un rapport area_ratio (sauf au bord de l'image, où le
+    nid-de-poule n'est vu qu'en partie).
+    Une piste est close quand sa prédiction sort de l'image ou sans détection
+    depuis max_age_s secondes ; les images ignorées comme doublons la
+    maintiennent, immobile (véhicule à l'arrêt).
+    """
+
+    def __init__(self, frame_shape, max_motion=1.5, min_radius=0.03, velocity_tolerance=0.5,
+                 area_ratio=4.0, max_age_s=1.0):
+        self.height, self.width = frame_shape[:2]
+        diagonal = float(np.hypot(self.height, self.width))
+        self.max_speed = max_motion * diagonal
+        self.min_radius = min_radius * diagonal
+        self.velocity_tolerance = velocity_tolerance
+        self.area_ratio = area_ratio
+        self.max_age_s = max_age_s
+        self.active = []
+        self.tracks = []
+        self.last_motion = 0.0  # plus grand déplacement (pixels) d'une piste prolongée à la dernière image
+
+    @staticmethod
+    def _center(p):
+        return (p['position']['x'] + p['dimensions']['largeur'] / 2,
+                p['position']['y'] + p['dimensions']['hauteur'] / 2)
+
+    def _at_border(self, p):
+        x, y = p['position']['x'], p['position']['y']
+        return (x <= 1 or y <= 1 or x + p['dimensions']['largeur'] >= self.width - 1
+                or y + p['dimensions']['hauteur'] >= self.height - 1)
+
+    def _predict(self, track, t):
+        """Centre prédit à l'instant t et rayon d'association"""
+        dt = t - track['_vu_s']
+        (x, y), velocity = track['_centre'], track['_vitesse']
+        if velocity is None:
+            return (x, y), max(self.min_radius, self.max_speed * dt)
+        vx, vy = velocity
+        return (x + vx * dt, y + vy * dt), self.min_radius + self.velocity_tolerance * np.hypot(vx, vy) * dt
+
+    def _in_frame(self, center):
+        return -self.min_radius <= center[0] <= self.width + self.min_radius and \
+            -self.min_radius <= center[1] <= self.height + self.min_radius
+
+    def hold(self, t):
+        """Image ignorée comme doublon : les pistes actives restent en vue, immobiles"""
+        for tr in self.active:
+            tr['_vu_s'] = t
+            tr['_vitesse'] = None
+
+    def update(self, index, t, detections):
+        """Associe les détections d'une image ; renvoie les pistes créées"""
+        active, predictions = [], []
+        for tr in self.active:
+            center, radius = self._predict(tr, t)
+            if t - tr['_vu_s'] <= self.max_age_s and self._in_frame(center):
+                active.append(tr)
+                predictions.append((center, radius))
+        self.active = active
+
+        candidates = []
+        for i, p in enumerate(detections):
+            cx, cy = self._center(p)
+            partial = self._at_border(p)
+            for j, tr in enumerate(self.active):
+                (px, py), radius = predictions[j]
+                dist = np.hypot(cx - px, cy - py)
+                ratio = max(p['superficie'], tr['_superficie']) / max(min(p['superficie'], tr['_superficie']), 1e-9)
+                if dist <= radius and (ratio <= self.area_ratio or partial or tr['_bord']):
+                    candidates.append((dist, i, j))
+
+        # Appariement glouton, de l'écart à la prédiction le plus faible au plus fort
+        matched_det, matched_track = set(), set()
+        self.last_motion = 0.0
+        for _, i, j in sorted(candidates):
+            if i in matched_det or j in matched_track:
+                continue
+            matched_det.add(i)
+            matched_track.add(j)
+            track = self.active[j]
+            center = self._center(detections[i])
+            self.last_motion = max(self.last_motion, np.hypot(center[0] - track['_centre'][0],
+                                                              center[1] - track['_centre'][1]))
+            self._extend(track, index, t, detections[i])
+
+        created = []
+        for i, p in enumerate(detections):
+            if i not in matched_det:
+                track = {'id': len(self.tracks), 'premiere_image': index, 'temps_debut_s': t, 'observations': 0,
+                         '_vitesse': None}
+                self._extend(track, index, t, p)
+                self.tracks.append(track)
+                self.active.append(track)
+                created.append(track)
+        return created
+
+    def _extend(self, track, index, t, p):
+        center = self._center(p)
+        if track['observations'] and t > track['_vu_s']:
+            dt = t - track['_vu_s']
+            track['_vitesse'] = ((center[0] - track['_centre'][0]) / dt, (center[1] - track['_centre'][1]) / dt)
+        track['derniere_image'] = index
+        track['temps_fin_s'] = t
+        track['observations'] += 1
+        track['_vu_s'] = t
+        track['_centre'] = center
+        track['_superficie'] = p['superficie']
+        track['_bord'] = self._at_border(p)
+        # La plus grande observation est la plus proche de la caméra
+        if p['superficie'] >= track.get('superficie', 0):
+            track.update(image=index, position=p['position'], dimensions=p['dimensions'], superficie=p['superficie'])
+
+    def results(self, min_observations=1):
+        return [{k: v for k, v in tr.items() if not k.startswith('_')}
+                for tr in self.tracks if tr['observations'] >= min_observations]
+
+
+def stream_potholes(video_path, max_side=VIDEO_MAX_SIDE, duplicate_fraction=DUPLICATE_FRACTION,
+                    target_change=TARGET_CHANGE, max_stride=MAX_STRIDE, realtime=True, prefetch=8,
+                    tracker_options=None, stats=None):
+    """
+    Générateur d'un dict par image analysée : rang, temps, détections et
+    nouveaux nids-de-poule (pistes créées). stats (dict) est complété au fil
+    de la lecture ; stats['tracker'] donne les pistes.
+    """
+    reader = FrameReader(video_path, prefetch=prefetch)
+    stats = {} if stats is None else stats
+    stats.update(images_analysees=0, doublons=0)
+    tracker, last_thumb = None, None
+    start = time.perf_counter()
+    for index, t, gray, thumb in reader:
+        if tracker is None:
+            tracker = PotholeTracker(gray.shape, **(tracker_options or {}))
+            stats['tracker'] = tracker
+        stats['fps'] = reader.fps
+        stats['images_lues'] = reader.frames_read
+
+        if last_thumb is not None:
+            change, changed = frame_change(thumb, last_thumb)
+            if changed <= duplicate_fraction:
+                stats['doublons'] += 1
+                tracker.hold(t)
+                reader.stride = min(reader.stride * 2, max_stride)
+                continue
+            if change < target_change / 2:
+                reader.stride = min(reader.stride * 2, max_stride)
+            elif change > target_change * 2:
+                reader.stride = max(reader.stride // 2, 1)
+        if realtime and time.perf_counter() - start > t:
+            # En retard sur la vidéo : moins d'images analysées
+            reader.stride = min(reader.stride + 1, max_stride)
+        last_thumb = thumb
+
+        detections = detect_potholes_in_gray(gray, max_side)
+        created = tracker.update(index, t, detections)
+        if tracker.last_motion > MAX_STEP_MOTION * gray.shape[0]:
+            reader.stride = max(reader.stride // 2, 1)
+        stats['images_analysees'] += 1
+        yield {'image': index, 'temps_s': t, 'pas': reader.stride,
+               'detections': detections, 'nouveaux': [tr['id'] for tr in created]}
+    stats['images_lues'] = reader.frames_read
+    stats['fps'] = reader.fps
+
+
+@timed('detect_potholes_video')
+def detect_potholes_video(video_path, min_observations=1, **kwargs):
+    """
+    Nids-de-poule distincts d'une vidéo (une entrée par piste, à sa plus
+    grande observation) et statistiques de traitement.
+    """
+    stats = {}
+    start = time.perf_counter()
+    for _ in stream_potholes(video_path, stats=stats, **kwargs):
+        pass
+    elapsed = time.perf_counter() - start
+    tracker = stats.get('tracker')
+    potholes = tracker.results(min_observations) if tracker else []
+    duree = stats.get('images_lues', 0) / stats['fps'] if stats.get('fps') else 0.0
+    return {
+        'video': video_path,
+        'nombre_nids_poule': len(potholes),
+        'superficie_totale': sum(p['superficie'] for p in potholes),
+        'details': potholes,
+        'images_lues': stats.get('images_lues', 0),
+        'images_analysees': stats.get('images_analysees', 0),
+        'doublons_ignores': stats.get('doublons', 0),
+        'duree_video_s': duree,
+        'duree_traitement_s': elapsed,
+        'facteur_temps_reel': duree / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Détection des nids-de-poule sur une vidéo embarquée")
+    parser.add_argument('video')
+    parser.add_argument('-o', '--output', help="fichier JSON des résultats (par défaut : sortie standard)")
+    parser.add_argument('--max-side', type=int, default=VIDEO_MAX_SIDE)
+    parser.add_argument('--max-stride', type=int, default=MAX_STRIDE)
+    parser.add_argument('--min-observations', type=int, default=1)
+    parser.add_argument('--all-frames', action='store_true', help="ne pas allonger le pas quand le traitement prend du retard")
+    args = parser.parse_args(argv)
+
+    result = detect_potholes_video(args.video, min_observations=args.min_observations, max_side=args.max_side,
+                                   max_stride=args.max_stride, realtime=not args.all_frames)
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+    print(f"{result['nombre_nids_poule']} nids-de-poule distincts, {result['images_analysees']}/{result['images_lues']} "
+          f"images analysées, {result['facteur_temps_reel']:.1f}x temps réel", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+# batch_scoring.py
+"""
+Rapport de priorisation de toutes les communes, sans Streamlit.
+
+La feuille d'indicateurs est lue par blocs (xlsx, csv ou parquet) ; chaque
+partition (Ville, Commune) d'un bloc est notée par MaintenancePredictor
+dans un pool de processus et le rapport est écrit au fil de l'eau.
+
+    python -m services.batch_scoring data/uploads/indicateurs_urbains.xlsx -o rapport.parquet
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from services.dtypes import degraded_mask
+
+PARTITION_COLUMNS = ['Ville', 'Nom de la Commune']
+REPORT_COLUMNS = ['Ville', 'Commune', 'Tronçon', 'Priorité', 'Score Risque', 'Action Recommandée', 'État Actuel']
+
+_predictor = None  # un prédicteur par processus de travail
+_scorer = None  # mémoire des scores chargée par chaque processus de travail (voir _init_worker)
+
+
+# ---------- Lecture par blocs ----------
+def iter_sheet_chunks(path, chunk_size=50000):
+    """DataFrames successifs d'au plus chunk_size lignes (en-têtes nettoyés)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+    elif ext == '.parquet':
+        import pyarrow.parquet as pq
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    elif ext in ('.xlsx', '.xlsm'):
+        chunks = _iter_excel_chunks(path, chunk_size)
+    else:
+        raise ValueError(f"Format non pris en charge : {path}")
+    for chunk in chunks:
+        chunk.columns = chunk.columns.astype(str).str.strip()
+        yield chunk
+
+
+def _iter_excel_chunks(path, chunk_size):
+    # Lecture en flux (read_only) : le classeur n'est jamais chargé en entier
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(c) if c is not None else '' for c in next(rows, ())]
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= chunk_size:
+                yield pd.DataFrame.from_records(block, columns=header)
+                block = []
+        if block:
+            yield pd.DataFrame.from_records(block, columns=header)
+    finally:
+        wb.close()
+
+
+def iter_partitions(chunks):
+    """(ville, commune, DataFrame) pour chaque partition de chaque bloc"""
+    for chunk in chunks:
+        for col in PARTITION_COLUMNS:
+            if col not in chunk.columns:
+                chunk[col] = None
+        for (ville, commune), part in chunk.groupby(PARTITION_COLUMNS, sort=False, dropna=False):
+            yield ville, commune, part
+
+
+# ---------- Notation ----------
+def report_frame(ville, commune, df, preds):
+    """Rapport au format de l'onglet Analyse IA, avec la ville et la commune"""
+    troncons = df['tronçon de voirie'] if 'tronçon de voirie' in df.columns else pd.Series(None, index=df.index)
+    degrade = degraded_mask(df)
+    return pd.DataFrame({
+        'Ville': None if pd.isna(ville) else str(ville),
+        'Commune': None if pd.isna(commune) else str(commune),
+        'Tronçon': troncons.astype('string'),  # les cellules vides restent manquantes (<NA>, pandas 2 et 3)
+        'Priorité': preds['label'],
+        'Score Risque': preds['score'].astype('int64'),
+        'Action Recommandée': preds['action'],
+        'État Actuel': np.where(degrade, "Dégradé", "Stable"),
+    }, index=df.index, columns=REPORT_COLUMNS)
+
+
+def get_predictor():
+    global _predictor
+    if _predictor is None:
+        from models.predictive_maintenance import MaintenancePredictor
+        _predictor = MaintenancePredictor()
+    return _predictor
+
+
+def score_rows(df):
+    return get_predictor().predict_priority_batch(df)
+
+
+def _init_worker(store_dir):
+    global _scorer
+    if store_dir:
+        from services.score_store import IncrementalScorer
+        _scorer = IncrementalScorer(get_predictor(), store_dir)
+
+
+def _score_part(ville, commune, part, scorer=None):
+    """(rapport de la partition, nouveaux scores à mémoriser ou None)"""
+    scorer = scorer or _scorer
+    if scorer is None:
+        return report_frame(ville, commune, part, score_rows(part)), None
+    preds, new = scorer.score_new(part)
+    if scorer is _scorer:
+        # Réutilisés par ce processus pour ses partitions suivantes
+        scorer.store.add(*new)
+    return report_frame(ville, commune, part, preds), new
+
+
+def score_partitions(partitions, workers=None, max_in_flight=None, scorer=None):
+    """
+    Générateur de rapports par partition, dans l'ordre de lecture.
+    workers=1 note dans le processus courant (pas de sérialisation).
+    Avec scorer (IncrementalScorer), chaque processus charge la mémoire des
+    scores au démarrage, calcule les clés, ne note que les lignes absentes et
+    assemble le rapport ; seuls les nouveaux scores reviennent au processus
+    courant, qui les mémorise dans scorer.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(scorer.store.store_dir if scorer else None,))
+    try:
+        in_flight = deque()
+        for ville, commune, part in partitions:
+            if pool is None:
+                task = _score_part(ville, commune, part, scorer)
+            else:
+                task = pool.submit(_score_part, ville, commune, part)
+            in_flight.append((len(part), task))
+            if len(in_flight) >= max_in_flight or pool is None:
+                yield _finish(in_flight.popleft(), scorer)
+        while in_flight:
+            yield _finish(in_flight.popleft(), scorer)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def _finish(item, scorer):
+    n_rows, task = item
+    report, new = task.result() if hasattr(task, 'result') else task
+    if scorer:
+        scorer.absorb(n_rows, new)
+    return report
+
+
+# ---------- Écriture ----------
+class ReportWriter:
+    """
+    Écriture incrémentale du rapport (Parquet ou CSV selon l'extension).
+    output_path peut aussi être un fichier binaire ouvert (export en mémoire),
+    fmt ('parquet' ou 'csv') indiquant alors le format.
+    """
+
+    def __init__(self, output_path, fmt=None):
+        self.output_path = output_path
+        self.binary = not isinstance(output_path, (str, os.PathLike))
+        if fmt is None:
+            fmt = 'parquet' if str(output_path).lower().endswith('.parquet') else 'csv'
+        self.parquet = fmt == 'parquet'
+        self._writer = None
+        self._header = True
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, schema=self.schema(), preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.output_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            self._write_csv(df)
+            self._header = False
+
+    def _write_csv(self, df):
+        mode = ('w' if self._header else 'a') + ('b' if self.binary else '')
+        df.to_csv(self.output_path, mode=mode, header=self._header, index=False)
+
+    @staticmethod
+    def schema():
+        import pyarrow as pa
+        return pa.schema([(col, pa.int64() if col == 'Score Risque' else pa.string()) for col in REPORT_COLUMNS])
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self.parquet:
+            # Feuille vide : fichier valide sans ligne
+            import pyarrow.parquet as pq
+            pq.write_table(self.schema().empty_table(), self.output_path)
+        elif self._header:
+            self._write_csv(pd.DataFrame(columns=REPORT_COLUMNS))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run(input_path, output_path, chunk_size=50000, workers=None, flush_rows=100000, progress=True, store_dir=None):
+    """
+    Note toute la feuille et écrit le rapport ; renvoie les statistiques.
+    store_dir : mémoire des scores (re-notation incrémentale entre deux relevés).
+    """
+    scorer = None
+    if store_dir:
+        from services.score_store import IncrementalScorer
+        scorer = IncrementalScorer(get_predictor(), store_dir)
+    start = time.perf_counter()
+    n_rows = 0
+    # Une même (ville, commune) revient dans chaque bloc lu : compter les clés distinctes
+    partition_keys = set()
+    pending, pending_rows = [], 0
+
+    with ReportWriter(output_path) as writer:
+        partitions = iter_partitions(iter_sheet_chunks(input_path, chunk_size))
+        for report in score_partitions(partitions, workers=workers, scorer=scorer):
+            pending.append(report)
+            pending_rows += len(report)
+            n_rows += len(report)
+            partition_keys.add((report['Ville'].iat[0], report['Commune'].iat[0]))
+            # Écritures groupées : moins de petits row groups Parquet
+            if pending_rows >= flush_rows:
+                writer.write(pd.concat(pending, ignore_index=True))
+                pending, pending_rows = [], 0
+                if progress:
+                    _print_progress(n_rows, len(partition_keys), start)
+        if pending:
+            writer.write(pd.concat(pending, ignore_index=True))
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'lignes': n_rows,
+        'partitions': len(partition_keys),
+        'secondes': elapsed,
+        'lignes_par_seconde': n_rows / elapsed if elapsed > 0 else 0.0,
+    }
+    if scorer:
+        scorer.save()
+        stats.update(scorer.stats())
+    if progress:
+        _print_progress(n_rows, len(partition_keys), start, end='\n')
+    return stats
+
+
+def _print_progress(n_rows, n_partitions, start, end='\r'):
+    elapsed = time.perf_counter() - start
+    rate = n_rows / elapsed if elapsed > 0 else 0.0
+    print(f"{n_rows} tronçons, {n_partitions} partitions, {elapsed:.1f} s ({rate:,.0f} tronçons/s)",
+          end=end, file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="feuille d'indicateurs (.xlsx, .csv ou .parquet)")
+    parser.add_argument('-o', '--output', required=True, help="rapport (.parquet ou .csv)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="lignes lues par bloc")
+    parser.add_argument('--workers', type=int, default=None, help="processus de notation (1 = sans pool)")
+    parser.add_argument('--quiet', action='store_true', help="sans affichage de progression")
+    parser.add_argument('--store', help="dossier de la mémoire des scores (seules les lignes modifiées sont re-notées)")
+    args = parser.parse_args(argv)
+
+    stats = run(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers,
+                progress=not args.quiet, store_dir=args.store)
+    print(f"Rapport écrit : {args.output} ({stats['lignes']} tronçons, {stats['partitions']} partitions, "
+          f"{stats['lignes_par_seconde']:,.0f} tronçons/s)")
+    if args.store:
+        print(f"Mémoire des scores : {stats['hits']} réutilisés, {stats['misses']} calculés ({stats['taux_hits']:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
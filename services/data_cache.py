@@ -0,0 +1,167 @@
+# data_cache.py
+"""
+Cache disque du classeur d'indicateurs.
+
+Le DataFrame parsé est conservé au format colonne (Parquet, ou pickle si
+pyarrow est absent) avec les en-têtes HTTP de la dernière réponse. Chaque
+rafraîchissement envoie une requête conditionnelle (ETag / Last-Modified) et
+le classeur n'est re-parsé que si le hash de son contenu a changé.
+"""
+import hashlib
+import io
+import json
+import os
+import time
+
+import pandas as pd
+import requests
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+class SnapshotUnavailableError(RuntimeError):
+    """Aucune source (réseau ou instantané local) n'a pu fournir les données"""
+
+
+def parse_workbook(content, sheet_name=0):
+    """Parse le contenu binaire d'un classeur Excel (une feuille) en DataFrame"""
+    with io.BytesIO(content) as f:
+        df = pd.read_excel(f, sheet_name=sheet_name)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+class ExcelSnapshotCache:
+    def __init__(self, url, cache_dir='data/cache', name=None, timeout=10, offline=False, sheet=None):
+        """url : adresse HTTP(S) ou chemin local ; sheet : feuille à lire (la première par défaut)"""
+        self.url = url
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.offline = offline
+        self.sheet = sheet
+        self.name = name or os.path.splitext(os.path.basename(url))[0] + (f"__{sheet}" if sheet is not None else "")
+        self.meta_path = os.path.join(cache_dir, f"{self.name}.meta.json")
+        self.last_status = None  # 'offline', 'not_modified', 'unchanged', 'refreshed', 'fallback'
+
+    # ---------- Métadonnées et instantané ----------
+    def read_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, meta):
+        self._atomic_write(self.meta_path, json.dumps(meta, indent=2).encode('utf-8'))
+
+    def _atomic_write(self, path, data):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _snapshot_path(self, fmt):
+        return os.path.join(self.cache_dir, f"{self.name}.{fmt}")
+
+    def has_snapshot(self):
+        meta = self.read_meta()
+        return bool(meta.get('format')) and os.path.exists(self._snapshot_path(meta['format']))
+
+    def read_snapshot(self, meta=None):
+        meta = meta or self.read_meta()
+        if not meta.get('format') or not os.path.exists(self._snapshot_path(meta['format'])):
+            raise SnapshotUnavailableError(f"Aucun instantané local pour {self.name}")
+        path = self._snapshot_path(meta['format'])
+        if meta['format'] == 'parquet':
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    def write_snapshot(self, df):
+        """Écrit l'instantané (Parquet si possible) et retourne le format utilisé"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if HAS_PARQUET:
+            tmp = f"{self._snapshot_path('parquet')}.tmp"
+            try:
+                df.to_parquet(tmp, index=False)
+                os.replace(tmp, self._snapshot_path('parquet'))
+                return 'parquet'
+            except (ValueError, TypeError, pyarrow.ArrowException):
+                # Colonnes Excel de types mélangés : on se replie sur pickle
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        tmp = f"{self._snapshot_path('pkl')}.tmp"
+        df.to_pickle(tmp)
+        os.replace(tmp, self._snapshot_path('pkl'))
+        return 'pkl'
+
+    # ---------- Chargement ----------
+    def load(self):
+        """
+        Retourne le DataFrame à jour.
+        Hors ligne (ou si le réseau échoue) on sert le dernier instantané valide.
+        """
+        meta = self.read_meta()
+
+        if self.offline:
+            self.last_status = 'offline'
+            return self.read_snapshot(meta)
+
+        if self.url.startswith(('http://', 'https://')):
+            headers = {}
+            if self.has_snapshot():
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+
+            try:
+                response = requests.get(self.url, headers=headers, timeout=self.timeout)
+                if response.status_code == 304:
+                    self.last_status = 'not_modified'
+                    return self.read_snapshot(meta)
+                response.raise_for_status()
+            except requests.RequestException:
+                if self.has_snapshot():
+                    self.last_status = 'fallback'
+                    return self.read_snapshot(meta)
+                raise
+            content, etag, last_modified = response.content, response.headers.get('ETag'), response.headers.get('Last-Modified')
+        else:
+            # Fichier local : seul le hash du contenu décide du re-parsing
+            try:
+                with open(self.url, 'rb') as f:
+                    content = f.read()
+            except OSError:
+                if self.has_snapshot():
+                    self.last_status = 'fallback'
+                    return self.read_snapshot(meta)
+                raise
+            etag = last_modified = None
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        new_meta = {
+            'url': self.url,
+            'sheet': self.sheet,
+            'etag': etag,
+            'last_modified': last_modified,
+            'sha256': content_hash,
+            'format': meta.get('format'),
+            'fetched_at': time.time(),
+        }
+
+        if content_hash == meta.get('sha256') and self.has_snapshot():
+            # Même contenu servi sans en-têtes de cache : pas de re-parsing
+            self.last_status = 'unchanged'
+            df = self.read_snapshot(meta)
+        else:
+            self.last_status = 'refreshed'
+            df = parse_workbook(content, sheet_name=self.sheet if self.sheet is not None else 0)
+            new_meta['format'] = self.write_snapshot(df)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._write_meta(new_meta)
+        return df
@@ -0,0 +1,109 @@
+# dtypes.py
+"""
+Types compacts pour le jeu de données mis en cache.
+
+openpyxl renvoie des colonnes object (ou str) et float64 : compact_dtypes
+convertit les textes peu variés en catégories, le drapeau nid de poule en
+booléen et les colonnes numériques vers le plus petit type sans perte.
+Aucune conversion ne change le résultat des filtres, KPIs ou scores.
+"""
+import numpy as np
+import pandas as pd
+
+COL_NID_POULE = 'présence du nid de poule'
+
+# Seule valeur convertie en True : celle que degraded_mask reconnaît sur le texte
+TRUE_VALUE = 'Oui'
+
+# Au-delà de cette part de valeurs distinctes, une catégorie ne fait rien gagner
+CATEGORY_MAX_RATIO = 0.5
+
+
+def degraded_mask(df):
+    """Tronçons avec nid de poule (booléen compacté ou texte 'Oui')"""
+    if COL_NID_POULE not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    flag = df[COL_NID_POULE]
+    if pd.api.types.is_bool_dtype(flag):
+        return flag.to_numpy(dtype=bool)
+    return flag.eq(TRUE_VALUE).to_numpy(dtype=bool)
+
+
+def _flag_to_bool(serie):
+    """
+    Booléen équivalent au texte, ou None si la conversion perdrait de
+    l'information : seules la valeur exacte 'Oui' et les cellules vides (NaN)
+    sont admises. 'oui', ' Oui' ou 'Yes' (non dégradés pour degraded_mask mais
+    non vides pour les règles), 'Non' ou une chaîne vide laissent la colonne
+    en texte (catégorie).
+    """
+    if pd.api.types.is_bool_dtype(serie):
+        return serie
+    present = serie.notna()
+    if not present.any():
+        # Colonne entièrement vide : lue en float64 par openpyxl
+        return pd.Series(False, index=serie.index)
+    if pd.api.types.is_numeric_dtype(serie):
+        return None
+    if not serie[present].astype(str).eq(TRUE_VALUE).all():
+        return None
+    return present
+
+
+def _downcast_numeric(serie):
+    if pd.api.types.is_bool_dtype(serie):
+        return serie
+    if pd.api.types.is_integer_dtype(serie):
+        unsigned = serie.min() >= 0 if len(serie) else True
+        return pd.to_numeric(serie, downcast='unsigned' if unsigned else 'integer')
+    if pd.api.types.is_float_dtype(serie) and serie.dtype != np.float32:
+        values = serie.to_numpy(dtype=float)
+        compact = values.astype(np.float32)
+        # float32 seulement si toutes les valeurs font l'aller-retour à l'identique
+        if np.array_equal(compact.astype(float), values, equal_nan=True):
+            return pd.Series(compact, index=serie.index, name=serie.name)
+    return serie
+
+
+def compact_dtypes(df, category_max_ratio=CATEGORY_MAX_RATIO):
+    """Copie de df aux types compacts"""
+    out = {}
+    n = len(df)
+    for col in df.columns:
+        serie = df[col]
+        if col == COL_NID_POULE:
+            flag = _flag_to_bool(serie)
+            if flag is not None:
+                out[col] = flag.astype(bool)
+                continue
+        if pd.api.types.is_numeric_dtype(serie):
+            out[col] = _downcast_numeric(serie)
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            out[col] = serie
+        elif pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie):
+            n_unique = serie.nunique(dropna=True)
+            out[col] = serie.astype('category') if n and n_unique <= n * category_max_ratio else serie
+        else:
+            out[col] = serie
+    compact = pd.DataFrame(out, index=df.index)
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def memory_report(before, after):
+    """Mémoire (octets, deep) et type de chaque colonne, avant / après compactage"""
+    avant = before.memory_usage(deep=True, index=False)
+    apres = after.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'type_avant': before.dtypes.astype(str),
+        'type_apres': after.dtypes.astype(str),
+        'octets_avant': avant,
+        'octets_apres': apres,
+    })
+    report['gain'] = 1 - report['octets_apres'] / report['octets_avant'].where(report['octets_avant'] > 0)
+    total = pd.DataFrame({
+        'type_avant': [''], 'type_apres': [''],
+        'octets_avant': [avant.sum()], 'octets_apres': [apres.sum()],
+        'gain': [1 - apres.sum() / avant.sum() if avant.sum() else np.nan],
+    }, index=['TOTAL'])
+    return pd.concat([report, total])
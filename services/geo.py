@@ -0,0 +1,98 @@
+# geo.py
+"""
+Coordonnées GPS des tronçons.
+
+Tant que le classeur ne contient pas de vraies coordonnées, chaque ligne est
+placée autour du centre de sa commune avec un décalage dérivé d'un hash
+stable de son identité : les marqueurs ne bougent plus d'un chargement à
+l'autre et tout le calcul se fait en une passe NumPy.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+COMMUNE_COORDS = {
+    'Yaounde 1': {'lat': 3.8850, 'lon': 11.5200}, 'Yaounde 2': {'lat': 3.8980, 'lon': 11.5000},
+    'Yaounde 3': {'lat': 3.8400, 'lon': 11.5000}, 'Yaounde 4': {'lat': 3.8450, 'lon': 11.5500},
+    'Yaounde 5': {'lat': 3.8700, 'lon': 11.5400}, 'Yaounde 6': {'lat': 3.8550, 'lon': 11.4800},
+    'Yaounde 7': {'lat': 3.8750, 'lon': 11.4500}, 'Douala 1': {'lat': 4.0500, 'lon': 9.7000},
+    'Douala 2': {'lat': 4.0600, 'lon': 9.7100},   'Douala 3': {'lat': 4.0400, 'lon': 9.7300},
+    'Douala 4': {'lat': 4.0700, 'lon': 9.6600},   'Douala 5': {'lat': 4.0800, 'lon': 9.7500},
+}
+DEFAULT_COORDS = {'lat': 3.86, 'lon': 11.52}
+JITTER_DEG = 0.02
+
+# Colonnes qui identifient un tronçon (clé du hash et de la jointure GPS)
+SEGMENT_ID_COLUMNS = ['Ville', 'Nom de la Commune', 'tronçon de voirie']
+
+
+def _normalized_keys(df, columns):
+    return pd.DataFrame({c: df[c].astype(object).fillna('').astype(str).str.strip() for c in columns}, index=df.index)
+
+
+def segment_hash(df, columns=None):
+    """Hash uint64 stable de l'identité de chaque ligne (indépendant de la session)"""
+    columns = [c for c in (columns or SEGMENT_ID_COLUMNS) if c in df.columns]
+    keys = _normalized_keys(df, columns)
+    # Rang d'apparition pour distinguer les doublons d'identité
+    keys['_occurrence'] = keys.groupby(columns, sort=False, dropna=False).cumcount() if columns else np.arange(len(df))
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype=np.uint64)
+
+
+def simulated_coordinates(df):
+    """Coordonnées simulées (centre de commune + décalage déterministe)"""
+    if 'Nom de la Commune' in df.columns:
+        commune = df['Nom de la Commune'].astype(object).fillna('nan').astype(str).str.strip().str.title()
+    else:
+        commune = pd.Series('', index=df.index)
+    lat = commune.map({k: v['lat'] for k, v in COMMUNE_COORDS.items()}).fillna(DEFAULT_COORDS['lat']).to_numpy(dtype=float)
+    lon = commune.map({k: v['lon'] for k, v in COMMUNE_COORDS.items()}).fillna(DEFAULT_COORDS['lon']).to_numpy(dtype=float)
+
+    # Les 32 bits bas et hauts du hash donnent deux tirages uniformes dans [0, 1)
+    h = segment_hash(df)
+    u_lat = (h & np.uint64(0xFFFFFFFF)).astype(float) / 2.0 ** 32
+    u_lon = (h >> np.uint64(32)).astype(float) / 2.0 ** 32
+    return pd.DataFrame({
+        'latitude': lat + (2 * u_lat - 1) * JITTER_DEG,
+        'longitude': lon + (2 * u_lon - 1) * JITTER_DEG,
+    }, index=df.index)
+
+
+def read_coordinates_file(path):
+    """Lit un fichier de coordonnées réelles (CSV, Excel ou Parquet)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        side = pd.read_excel(path)
+    elif ext == '.parquet':
+        side = pd.read_parquet(path)
+    else:
+        side = pd.read_csv(path)
+    side.columns = side.columns.str.strip()
+    return side
+
+
+def assign_coordinates(df, coords_path=None):
+    """
+    Ajoute les colonnes latitude/longitude.
+    Si coords_path est fourni, les coordonnées réelles du fichier (jointes sur
+    les colonnes d'identité communes) remplacent les coordonnées simulées.
+    """
+    coords = simulated_coordinates(df)
+
+    if coords_path and os.path.exists(coords_path):
+        side = read_coordinates_file(coords_path)
+        keys = [c for c in SEGMENT_ID_COLUMNS if c in df.columns and c in side.columns]
+        if keys and {'latitude', 'longitude'} <= set(side.columns):
+            side_keys = _normalized_keys(side, keys)
+            side_keys[['latitude', 'longitude']] = side[['latitude', 'longitude']].apply(pd.to_numeric, errors='coerce')
+            side_keys = side_keys.drop_duplicates(keys, keep='last')
+            real = _normalized_keys(df, keys).merge(side_keys, how='left', on=keys)
+            for col in ('latitude', 'longitude'):
+                values = real[col].to_numpy(dtype=float)
+                coords[col] = np.where(np.isnan(values), coords[col].to_numpy(), values)
+
+    df = df.copy()
+    df['latitude'] = coords['latitude'].to_numpy()
+    df['longitude'] = coords['longitude'].to_numpy()
+    return df
@@ -0,0 +1,203 @@
+# image_service.py
+"""
+Service d'images de la galerie.
+
+Chaque image est récupérée (fichier local de data/uploads en priorité, sinon
+téléchargement) puis stockée sur disque sous le hash de son contenu. L'index
+nom -> hash est revalidé : par (mtime, taille) pour un fichier local, par une
+requête conditionnelle (ETag / Last-Modified) après REMOTE_TTL pour une image
+distante. Les vignettes WebP à la largeur de la galerie sont générées par un
+pool de threads, uniquement pour la page affichée.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from PIL import Image
+
+# Durée pendant laquelle une image introuvable n'est pas redemandée (secondes)
+NOT_FOUND_TTL = 3600  # fichier absent, 404 / 410
+ERROR_TTL = 60  # erreur réseau ou serveur, probablement passagère
+# Durée pendant laquelle une image distante en cache est servie sans revalidation (secondes)
+REMOTE_TTL = 3600
+
+
+class ImageService:
+    def __init__(self, url_for=None, local_root='data/uploads', cache_dir='data/cache/images',
+                 thumb_width=480, max_workers=4, timeout=10, offline=False):
+        self.url_for = url_for  # url_for(filename, folder) -> URL distante ou None
+        self.local_root = local_root
+        self.cache_dir = cache_dir
+        self.thumb_width = thumb_width
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.offline = offline
+
+        self.originals_dir = os.path.join(cache_dir, 'originals')
+        self.thumbs_dir = os.path.join(cache_dir, 'thumbs')
+        os.makedirs(self.originals_dir, exist_ok=True)
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+
+        # "dossier/fichier" -> {'digest', 'source': 'local' | 'remote', validateurs}
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = threading.Lock()
+        self._missing = {}  # clé -> instant jusqu'auquel l'image est considérée introuvable
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    @staticmethod
+    def _key(filename, folder):
+        return f"{folder}/{str(filename).strip()}"
+
+    def _save_index(self):
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+
+    # ---------- Originaux ----------
+    def _cached_path(self, entry):
+        """Original en cache d'une entrée d'index (None si absent du disque)"""
+        if not isinstance(entry, dict):
+            return None  # ancien format (hash seul) : revalidé
+        path = os.path.join(self.originals_dir, entry['digest'])
+        return path if os.path.exists(path) else None
+
+    def _fetch_remote(self, filename, folder, entry):
+        """
+        (contenu, métadonnées) : téléchargé, ou contenu None si le serveur
+        répond 304 (entrée inchangée) ; (None, durée) si introuvable, durée
+        pendant laquelle ne pas réessayer.
+        """
+        if self.offline or self.url_for is None:
+            return None, NOT_FOUND_TTL
+        url = self.url_for(filename, folder)
+        if not url:
+            return None, NOT_FOUND_TTL
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = requests.get(url, timeout=self.timeout, headers=headers)
+        except requests.RequestException:
+            return None, ERROR_TTL
+        if response.status_code == 304 and entry is not None:
+            return None, dict(entry, checked_at=time.time())
+        if response.status_code in (404, 410):
+            return None, NOT_FOUND_TTL
+        if not response.ok:
+            return None, ERROR_TTL
+        return response.content, {
+            'source': 'remote',
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'checked_at': time.time(),
+        }
+
+    def _store(self, key, content, meta):
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.originals_dir, digest)
+        if not os.path.exists(path):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        self._update_index(key, dict(meta, digest=digest))
+        return path
+
+    def _update_index(self, key, entry):
+        with self._lock:
+            self._index[key] = entry
+            self._save_index()
+
+    def original(self, filename, folder):
+        """Chemin de l'original en cache (None si l'image est introuvable)"""
+        if pd.isna(filename) or str(filename).strip() == "":
+            return None
+        key = self._key(filename, folder)
+        if self._missing.get(key, 0) > time.monotonic():
+            return None
+        entry = self._index.get(key)
+        cached = self._cached_path(entry)
+
+        # Fichier local : l'entrée vaut tant que (mtime, taille) n'a pas changé
+        local_path = os.path.join(self.local_root, folder, str(filename).strip())
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            stat = None
+        if stat is not None:
+            signature = [stat.st_mtime_ns, stat.st_size]
+            if cached and entry.get('source') == 'local' and entry.get('signature') == signature:
+                return cached
+            with open(local_path, 'rb') as f:
+                content = f.read()
+            self._missing.pop(key, None)
+            return self._store(key, content, {'source': 'local', 'signature': signature})
+
+        # Image distante : servie sans requête pendant REMOTE_TTL, puis revalidée
+        remote = cached and entry.get('source') == 'remote'
+        if remote and (self.offline or time.time() - entry.get('checked_at', 0) < REMOTE_TTL):
+            return cached
+        content, meta = self._fetch_remote(filename, folder, entry if remote else None)
+        if content is not None:
+            self._missing.pop(key, None)
+            return self._store(key, content, meta)
+        if isinstance(meta, dict):
+            self._update_index(key, meta)  # 304 : inchangée
+            return cached
+        if remote and meta == ERROR_TTL:
+            return cached  # erreur passagère : l'ancienne copie reste servie
+        self._missing[key] = time.monotonic() + meta
+        return None
+
+    # ---------- Vignettes ----------
+    def thumbnail(self, filename, folder):
+        """Chemin de la vignette WebP à la largeur de la galerie"""
+        original = self.original(filename, folder)
+        if original is None:
+            return None
+        digest = os.path.basename(original)
+        thumb_path = os.path.join(self.thumbs_dir, f"{digest}_{self.thumb_width}.webp")
+        if os.path.exists(thumb_path):
+            return thumb_path
+        try:
+            with Image.open(original) as img:
+                img.draft('RGB', (self.thumb_width, self.thumb_width))  # décodage JPEG réduit
+                img = img.convert('RGB')
+                if img.width > self.thumb_width:
+                    height = max(1, round(img.height * self.thumb_width / img.width))
+                    img = img.resize((self.thumb_width, height), Image.LANCZOS)
+                tmp = f"{thumb_path}.{threading.get_ident()}.tmp"
+                img.save(tmp, 'WEBP', quality=80)
+            os.replace(tmp, thumb_path)
+        except OSError:
+            return None
+        return thumb_path
+
+    def thumbnails(self, items):
+        """Vignettes d'une liste de (fichier, dossier), en parallèle, dans l'ordre"""
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda item: self.thumbnail(*item), items))
+
+
+def paginate(items, page, page_size):
+    """Retourne (éléments de la page, nombre de pages) ; page commence à 1"""
+    n_pages = max(1, math.ceil(len(items) / page_size))
+    page = min(max(1, page), n_pages)
+    start = (page - 1) * page_size
+    return items[start:start + page_size], n_pages
@@ -0,0 +1,115 @@
+# map_render.py
+"""
+Construction de la carte des tronçons.
+
+Au lieu d'un folium.Marker (et d'une icône) par ligne, tous les tronçons sont
+émis en une seule couche construite à partir des colonnes : GeoJSON de
+cercles colorés, ou FastMarkerCluster au-delà d'un seuil. Dans les deux cas,
+au-delà de max_points, les points sont simplifiés sur une grille avant le
+rendu : la taille du HTML envoyé au navigateur reste bornée. Les libellés
+sont échappés avant d'être insérés dans les popups HTML.
+"""
+import html
+
+import numpy as np
+
+from services.dtypes import degraded_mask
+
+COL_TRONCON = 'tronçon de voirie'
+
+COLOR_DEGRADED = 'red'
+COLOR_OK = 'green'
+
+# Couleur des points du cluster, appliquée côté navigateur
+CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 6, color: row[3], fillColor: row[3], fillOpacity: 0.8
+    });
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+def map_arrays(df):
+    """Coordonnées, libellés (échappés pour HTML) et dégradation sous forme de tableaux (lignes sans GPS exclues)"""
+    lat = df['latitude'].to_numpy(dtype=float)
+    lon = df['longitude'].to_numpy(dtype=float)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    if COL_TRONCON in df.columns:
+        labels = df[COL_TRONCON].astype(object).fillna('').astype(str).map(html.escape).to_numpy(dtype=object)
+    else:
+        labels = np.full(len(df), '', dtype=object)
+    degraded = degraded_mask(df)
+    return lat[valid], lon[valid], labels[valid], degraded[valid]
+
+
+def thin_points(lat, lon, degraded, max_points, cell_deg=0.0005):
+    """
+    Indices des points conservés : un point par cellule de grille (et par
+    état), puis un échantillonnage régulier si la limite est encore dépassée.
+    Les tronçons dégradés passent en premier.
+    """
+    n = len(lat)
+    if n <= max_points:
+        return np.arange(n)
+    cells = np.stack([np.floor(lat / cell_deg), np.floor(lon / cell_deg), degraded], axis=1)
+    _, keep = np.unique(cells, axis=0, return_index=True)
+    keep = np.sort(keep)
+    if len(keep) > max_points:
+        ordered = np.concatenate([keep[degraded[keep]], keep[~degraded[keep]]])
+        keep = np.sort(ordered[:max_points])
+    return keep
+
+
+def build_map(df, mode='auto', max_points=2000, cluster_threshold=5000, zoom_start=13):
+    """
+    Carte folium des tronçons de df.
+    mode : 'geojson', 'cluster', 'markers' (un marqueur par ligne) ou 'auto'
+    (GeoJSON jusqu'à cluster_threshold points, cluster au-delà).
+    max_points : nombre maximal de points envoyés en mode GeoJSON et cluster.
+    """
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    lat, lon, labels, degraded = map_arrays(df)
+    center = [float(lat.mean()), float(lon.mean())] if len(lat) else [3.86, 11.52]
+    m = folium.Map(location=center, zoom_start=zoom_start)
+    if not len(lat):
+        return m
+
+    if mode == 'auto':
+        mode = 'geojson' if len(lat) <= cluster_threshold else 'cluster'
+    colors = np.where(degraded, COLOR_DEGRADED, COLOR_OK)
+
+    if mode == 'markers':
+        for y, x, label, color in zip(lat, lon, labels, colors):
+            folium.Marker([y, x], popup=label, icon=folium.Icon(color=color)).add_to(m)
+    elif mode == 'cluster':
+        keep = thin_points(lat, lon, degraded, max_points)
+        data = [list(row) for row in zip(lat[keep].tolist(), lon[keep].tolist(), labels[keep].tolist(), colors[keep].tolist())]
+        FastMarkerCluster(data, callback=CLUSTER_CALLBACK).add_to(m)
+    else:
+        keep = thin_points(lat, lon, degraded, max_points)
+        features = {
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': [x, y]},
+                 'properties': {'troncon': label, 'color': color}}
+                for y, x, label, color in zip(lat[keep].tolist(), lon[keep].tolist(), labels[keep].tolist(), colors[keep].tolist())
+            ],
+        }
+        folium.GeoJson(
+            features,
+            marker=folium.CircleMarker(radius=6, fill=True, fill_opacity=0.8),
+            style_function=lambda f: {'color': f['properties']['color'], 'fillColor': f['properties']['color']},
+            popup=folium.GeoJsonPopup(fields=['troncon'], labels=False),
+        ).add_to(m)
+    return m
+
+
+def render_map_html(df, **kwargs):
+    """HTML complet de la carte (à mettre en cache par commune et version des données)"""
+    return build_map(df, **kwargs).get_root().render()
@@ -0,0 +1,110 @@
+# partition_index.py
+"""
+Index des partitions (Ville, Commune).
+
+Construit une seule fois par version du jeu de données : listes triées pour
+les filtres, positions des lignes de chaque partition et KPIs pré-agrégés.
+Changer de sélection devient une simple lecture de dictionnaire.
+"""
+import numpy as np
+import pandas as pd
+
+COL_VILLE = 'Ville'
+COL_COMMUNE = 'Nom de la Commune'
+COL_LINEAIRE = 'linéaire de voirie(ml)'
+COL_NID_POULE = 'présence du nid de poule'
+COL_TAUDIS = 'superficie de la poche du quartier de taudis'
+
+EMPTY_KPIS = {'troncons': 0, 'lineaire': 0.0, 'degrades': 0, 'taudis': 0.0}
+
+
+def dataset_version(df):
+    """Version du jeu de données (hash du contenu source si load_data l'a fourni)"""
+    version = df.attrs.get('version')
+    if version:
+        return version
+    return str(int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+
+class PartitionIndex:
+    def __init__(self, df):
+        self.df = df
+        self.version = dataset_version(df)
+
+        ville = self._as_str(df, COL_VILLE)
+        commune = self._as_str(df, COL_COMMUNE)
+
+        self.villes = sorted(ville.unique())
+        self.communes_by_ville = {
+            v: sorted(c) for v, c in commune.groupby(ville.to_numpy(), sort=False).unique().items()
+        }
+
+        groups = pd.DataFrame({'ville': ville.to_numpy(), 'commune': commune.to_numpy()})
+        self.positions = {k: np.asarray(v) for k, v in groups.groupby(['ville', 'commune'], sort=False).indices.items()}
+
+        # KPIs de toutes les partitions en une seule agrégation
+        kpis = pd.DataFrame({
+            'ville': groups['ville'],
+            'commune': groups['commune'],
+            'troncons': 1,
+            'lineaire': self._numeric(df, COL_LINEAIRE),
+            'degrades': self._present(df, COL_NID_POULE),
+            'taudis': self._numeric(df, COL_TAUDIS),
+        }).groupby(['ville', 'commune'], sort=False).sum()
+        self.kpis_by_partition = {
+            key: {
+                'troncons': int(row.troncons),
+                'lineaire': float(row.lineaire),
+                'degrades': int(row.degrades),
+                'taudis': float(row.taudis),
+            }
+            for key, row in zip(kpis.index, kpis.itertuples(index=False))
+        }
+
+    @staticmethod
+    def _as_str(df, column):
+        # Cellules vides -> 'nan', comme astype(str) sur une colonne object
+        if column not in df.columns:
+            return pd.Series('nan', index=df.index)
+        serie = df[column]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Colonne compactée : on ne touche qu'aux catégories, pas aux lignes
+            serie = serie.cat.rename_categories(serie.cat.categories.astype(str))
+            if serie.isna().any():
+                serie = serie.cat.add_categories('nan').fillna('nan')
+            return serie.cat.remove_unused_categories()
+        return serie.astype(object).fillna('nan').astype(str)
+
+    @staticmethod
+    def _present(df, column):
+        # Drapeau compacté en booléen ou cellule renseignée
+        if column not in df.columns:
+            return False
+        if pd.api.types.is_bool_dtype(df[column]):
+            return df[column].to_numpy(dtype=bool)
+        return df[column].notna().to_numpy()
+
+    @staticmethod
+    def _numeric(df, column):
+        if column not in df.columns:
+            return 0.0
+        return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+    def communes(self, ville):
+        return self.communes_by_ville.get(ville, [])
+
+    def rows(self, ville, commune):
+        """Positions (iloc) des lignes de la partition"""
+        return self.positions.get((ville, commune), np.array([], dtype=np.intp))
+
+    def ville_rows(self, ville):
+        """Positions (iloc, triées) de toutes les communes d'une ville"""
+        parts = [self.rows(ville, commune) for commune in self.communes(ville)]
+        return np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.intp)
+
+    def subset(self, ville, commune):
+        """Sous-DataFrame de la partition, sans masque sur tout le jeu de données"""
+        return self.df.iloc[self.rows(ville, commune)]
+
+    def kpis(self, ville, commune):
+        return self.kpis_by_partition.get((ville, commune), dict(EMPTY_KPIS))
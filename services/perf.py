@@ -0,0 +1,110 @@
+# perf.py
+"""
+Instrumentation légère des étapes d'un rerun Streamlit et des points
+d'entrée du package models.
+
+Activée par URBAN_AI_PERF=1 (export JSON lines optionnel via
+URBAN_AI_PERF_TRACE=chemin.jsonl). Désactivée, span() renvoie un contexte
+vide partagé et timed() se réduit à un test de booléen.
+"""
+import functools
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+_NULL_SPAN = nullcontext()
+
+
+class PerfRecorder:
+    def __init__(self, enabled=False, window=500, trace_path=None):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        # Durées récentes par étape, toutes sessions confondues
+        self._history = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+        self._local = threading.local()  # un rerun Streamlit = un thread
+
+    # ---------- Rerun courant ----------
+    def start_run(self):
+        if not self.enabled:
+            return
+        self._local.run_id = uuid.uuid4().hex[:12]
+        self._local.spans = []
+        self._local.stack = []
+
+    def end_run(self):
+        """Termine le rerun : exporte la trace et renvoie [(étape, ms)]"""
+        if not self.enabled:
+            return []
+        spans = getattr(self._local, 'spans', [])
+        if self.trace_path and spans:
+            run_id = self._local.run_id
+            lines = [json.dumps({'ts': ts, 'run': run_id, 'span': name, 'ms': ms}) for name, ms, ts in spans]
+            with self._lock, open(self.trace_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        return [(name, ms) for name, ms, _ in spans]
+
+    # ---------- Mesure ----------
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+            self._local.spans = []
+            self._local.run_id = uuid.uuid4().hex[:12]
+        stack.append(name)
+        full_name = '/'.join(stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            stack.pop()
+            self._local.spans.append((full_name, ms, time.time()))
+            with self._lock:
+                self._history[full_name].append(ms)
+
+    def timed(self, name):
+        """Décorateur : span autour de chaque appel de la fonction"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---------- Statistiques ----------
+    def percentiles(self):
+        """p50 / p90 / p99 (ms) et nombre de mesures par étape"""
+        with self._lock:
+            history = {name: list(values) for name, values in self._history.items()}
+        stats = {}
+        for name, values in sorted(history.items()):
+            if len(values) >= 2:
+                q = statistics.quantiles(values, n=100, method='inclusive')
+                p50, p90, p99 = q[49], q[89], q[98]
+            else:
+                p50 = p90 = p99 = values[0]
+            stats[name] = {'n': len(values), 'p50': p50, 'p90': p90, 'p99': p99}
+        return stats
+
+
+recorder = PerfRecorder(
+    enabled=os.environ.get('URBAN_AI_PERF', '0') == '1',
+    trace_path=os.environ.get('URBAN_AI_PERF_TRACE'),
+)
+span = recorder.span
+timed = recorder.timed
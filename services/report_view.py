@@ -0,0 +1,74 @@
+# report_view.py
+"""
+Rapport de priorisation de l'onglet Analyse IA, paginé côté serveur.
+
+Le rapport est trié une seule fois par score de risque ; la priorité y est
+une colonne catégorielle (ordre de NIVEAUX_PRIORITE) : les effectifs par
+niveau sortent d'une seule agrégation et seule la page affichée est mise en
+forme et envoyée au navigateur. L'export (CSV ou Parquet) est écrit par
+blocs, à la demande, au format du rapport de batch_scoring.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from services.batch_scoring import REPORT_COLUMNS, ReportWriter
+
+PAGE_SIZE = 100
+EXPORT_CHUNK_ROWS = 50000
+
+# Colonnes affichées (la ville et la commune sont celles des filtres)
+DISPLAY_COLUMNS = [c for c in REPORT_COLUMNS if c not in ('Ville', 'Commune')]
+
+
+def priority_levels():
+    """Libellés de priorité, du plus urgent au moins urgent"""
+    from models.predictive_maintenance import NIVEAUX_PRIORITE
+    return [label for _, label, _ in NIVEAUX_PRIORITE]
+
+
+class ReportView:
+    def __init__(self, report, page_size=PAGE_SIZE):
+        """report : DataFrame aux colonnes REPORT_COLUMNS (voir batch_scoring.report_frame)"""
+        levels = priority_levels()
+        report = report.sort_values('Score Risque', ascending=False, kind='stable')
+        report['Priorité'] = pd.Categorical(report['Priorité'], categories=levels, ordered=True)
+        self.report = report
+        self.page_size = page_size
+        self.urgent = levels[0]
+
+    def __len__(self):
+        return len(self.report)
+
+    @property
+    def n_pages(self):
+        return max(1, -(-len(self.report) // self.page_size))
+
+    def page(self, page):
+        """Lignes de la page (à partir de 1), colonnes affichées"""
+        page = min(max(1, int(page)), self.n_pages)
+        start = (page - 1) * self.page_size
+        return self.report[DISPLAY_COLUMNS].iloc[start:start + self.page_size]
+
+    def counts(self):
+        """Nombre de tronçons par niveau de priorité (tous les niveaux, même vides)"""
+        return self.report['Priorité'].value_counts(sort=False).to_dict()
+
+    def styled_page(self, page):
+        """Page mise en forme : niveau le plus urgent en rouge, calculé sur la colonne catégorielle"""
+        def colors(priorite):
+            return np.where(priorite == self.urgent, 'color: red; font-weight: bold', 'color: black; font-weight: bold')
+        return self.page(page).style.apply(colors, subset=['Priorité'])
+
+    def export(self, fmt='csv', chunk_rows=EXPORT_CHUNK_ROWS):
+        """
+        Rapport complet (CSV ou Parquet) écrit par blocs dans un BytesIO
+        rembobiné (type accepté par st.download_button).
+        """
+        output = io.BytesIO()
+        with ReportWriter(output, fmt) as writer:
+            for start in range(0, len(self.report), chunk_rows):
+                writer.write(self.report.iloc[start:start + chunk_rows])
+        output.seek(0)
+        return output
@@ -0,0 +1,212 @@
+# score_store.py
+"""
+Mémoire persistante des scores de priorité.
+
+Chaque tronçon est identifié par un hash 64 bits des valeurs brutes des
+colonnes lues par les règles (SCORING_COLUMNS) : bits des flottants pour
+les colonnes numériques, hash stable des valeurs distinctes pour les textes
+et catégories — aucune normalisation de chaîne ligne par ligne. Deux
+écritures d'une même valeur (' Oui' / 'Oui', 5 / 5.0 en texte) donnent deux
+clés : un score recalculé de plus, jamais un score faux. Un fichier par
+version des règles/modèle (MaintenancePredictor.version) ; seules les lignes
+nouvelles ou modifiées passent par predict_priority_batch.
+
+Les prédictions sont gardées sous forme d'indices de niveau
+(NIVEAUX_PRIORITE) : la fusion ne recopie aucune chaîne.
+"""
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from services.data_cache import HAS_PARQUET
+
+STORE_COLUMNS = ['niveau', 'score', 'confiance']
+STORE_DTYPES = {'niveau': np.int8, 'score': np.int64, 'confiance': np.int64}
+
+_NA_HASH = np.uint64(0x9E3779B97F4A7C15)
+_NAN_BITS = np.float64(np.nan).view(np.uint64)
+
+
+def _mix(h):
+    """Finaliseur splitmix64 (arithmétique uint64 modulo 2**64)"""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _stable_hash(value):
+    # Indépendant du processus (contrairement à hash()) : clés valables d'un run à l'autre
+    digest = hashlib.blake2b(f"{type(value).__name__}:{value!r}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _column_hash(serie):
+    """Hash uint64 de chaque valeur brute d'une colonne"""
+    if pd.api.types.is_bool_dtype(serie) or (pd.api.types.is_numeric_dtype(serie)
+                                              and not isinstance(serie.dtype, pd.CategoricalDtype)):
+        values = serie.to_numpy(dtype=float, na_value=np.nan)
+        bits = values.view(np.uint64).copy()
+        bits[np.isnan(values)] = _NAN_BITS
+        return _mix(bits)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codes, uniques = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codes, uniques = pd.factorize(serie)
+    # Une entrée par valeur distincte, puis take ; le code -1 (cellule vide) tombe sur _NA_HASH
+    table = np.array([_stable_hash(u) for u in uniques] + [int(_NA_HASH)], dtype=np.uint64)
+    return table[codes]
+
+
+def row_keys(df):
+    """Hash stable (uint64) des colonnes de notation de chaque ligne"""
+    from models.predictive_maintenance import SCORING_COLUMNS
+    h = np.zeros(len(df), dtype=np.uint64)
+    for i, col in enumerate(SCORING_COLUMNS):
+        column = _column_hash(df[col]) if col in df.columns else np.full(len(df), _NA_HASH)
+        h = _mix(h ^ column ^ np.uint64(i + 1))
+    return h
+
+
+class ScoreStore:
+    """
+    Clés et prédictions gardées en tableaux NumPy (take rapide). Les nouveaux
+    scores sont fusionnés par paliers : une ligne ajoutée pendant un run peut
+    rester invisible jusqu'à la fusion suivante et être recalculée, sans
+    effet sur le résultat.
+    """
+
+    def __init__(self, store_dir, version):
+        self.store_dir = store_dir
+        self.version = version
+        fmt = 'parquet' if HAS_PARQUET else 'pkl'
+        self.path = os.path.join(store_dir, f"scores_{version}.{fmt}")
+        self._lock = threading.Lock()
+        self._keys, self._values = self._read()
+        self._pending = []  # (clés, {colonne: valeurs}) pas encore fusionnés
+        self._pending_rows = 0
+        self._dirty = False
+
+    def _read(self):
+        try:
+            if self.path.endswith('.parquet'):
+                frame = pd.read_parquet(self.path)
+            else:
+                frame = pd.read_pickle(self.path)
+            keys = pd.Index(frame['key'].to_numpy(dtype='uint64'))
+            return keys, {col: frame[col].to_numpy(dtype=STORE_DTYPES[col]) for col in STORE_COLUMNS}
+        except (OSError, ValueError, KeyError):
+            # Absente ou d'un ancien format : repart vide
+            return pd.Index([], dtype='uint64'), {col: np.empty(0, dtype=STORE_DTYPES[col]) for col in STORE_COLUMNS}
+
+    def __len__(self):
+        return len(self._keys) + self._pending_rows
+
+    def _merge_pending(self):
+        keys = np.concatenate([self._keys.to_numpy()] + [k for k, _ in self._pending])
+        values = {col: np.concatenate([self._values[col]] + [v[col] for _, v in self._pending])
+                  for col in STORE_COLUMNS}
+        unique = ~pd.Index(keys).duplicated()
+        self._keys = pd.Index(keys[unique])
+        self._values = {col: values[col][unique] for col in STORE_COLUMNS}
+        self._pending, self._pending_rows = [], 0
+
+    def lookup(self, keys):
+        """Positions des clés (-1 si absente) et prédictions des clés trouvées"""
+        with self._lock:
+            positions = self._keys.get_indexer(keys)
+            hit = positions[positions >= 0]
+            found = {col: values[hit] for col, values in self._values.items()}
+        return positions, found
+
+    def add(self, keys, values):
+        """keys : clés uint64 ; values : {colonne de STORE_COLUMNS: tableau}"""
+        if not len(keys):
+            return
+        values = {col: np.asarray(values[col], dtype=STORE_DTYPES[col]) for col in STORE_COLUMNS}
+        with self._lock:
+            self._pending.append((np.asarray(keys, dtype='uint64'), values))
+            self._pending_rows += len(keys)
+            self._dirty = True
+            # Fusion dès que les ajouts atteignent la taille de la mémoire : coût amorti linéaire
+            if self._pending_rows >= max(len(self._keys), 10000):
+                self._merge_pending()
+
+    def save(self):
+        """Écriture atomique, seulement si de nouveaux scores ont été ajoutés"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            if self._pending:
+                self._merge_pending()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            frame = pd.DataFrame({'key': self._keys.to_numpy(), **self._values})
+            if self.path.endswith('.parquet'):
+                frame.to_parquet(tmp, index=False)
+            else:
+                frame.to_pickle(tmp)
+            os.replace(tmp, self.path)
+            self._dirty = False
+            return True
+
+
+class IncrementalScorer:
+    """
+    predict_priority_batch avec mémoire. score_new() note un DataFrame et
+    renvoie les scores nouvellement calculés sans les mémoriser : dans un pool
+    de processus, chaque processus charge la mémoire au démarrage et le
+    processus parent fusionne les nouveaux scores (absorb).
+    hits / misses comptent les lignes passées par absorb ou score.
+    """
+
+    def __init__(self, predictor, store_dir='data/cache/scores'):
+        self.predictor = predictor
+        self.store = ScoreStore(store_dir, predictor.version)
+        self.hits = 0
+        self.misses = 0
+
+    def score_new(self, df):
+        """(prédictions de df, nouveaux scores (clés, {colonne: valeurs}) des lignes absentes)"""
+        from models.predictive_maintenance import priority_frame
+        keys = row_keys(df)
+        positions, found = self.store.lookup(keys)
+        missing = positions < 0
+
+        values = {col: np.empty(len(df), dtype=STORE_DTYPES[col]) for col in STORE_COLUMNS}
+        new = {}
+        if missing.any():
+            new = dict(zip(STORE_COLUMNS, self.predictor.predict_levels(df[missing])))
+        for col in STORE_COLUMNS:
+            values[col][~missing] = found[col]
+            if new:
+                values[col][missing] = new[col]
+        preds = priority_frame(values['niveau'], values['score'], values['confiance'], df.index)
+        return preds, (keys[missing], new)
+
+    def absorb(self, n_rows, new):
+        """Mémorise les scores renvoyés par score_new pour n_rows lignes notées"""
+        keys, values = new
+        self.store.add(keys, values)
+        self.misses += len(keys)
+        self.hits += n_rows - len(keys)
+
+    def score(self, df):
+        """Même résultat que predictor.predict_priority_batch(df)"""
+        preds, new = self.score_new(df)
+        self.absorb(len(df), new)
+        return preds
+
+    def save(self):
+        return self.store.save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taux_hits': self.hits / total if total else 0.0,
+            'scores_memorises': len(self.store),
+        }
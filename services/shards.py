@@ -0,0 +1,123 @@
+# shards.py
+"""
+Chargement d'un jeu de données réparti en plusieurs classeurs.
+
+Un manifeste JSON liste les classeurs (ou feuilles) — un par ville ou
+campagne de relevés :
+
+    {"shards": [
+        {"name": "yaounde", "url": "yaounde.xlsx"},
+        {"name": "douala_2024", "url": "https://.../douala.xlsx", "sheet": "2024"}
+    ]}
+
+Les chemins relatifs sont résolus par rapport au manifeste. Chaque classeur
+a son propre ExcelSnapshotCache : il n'est re-parsé que si son contenu
+change. Les classeurs sont chargés en parallèle (threads), leurs colonnes alignées,
+puis concaténés regroupés par Ville.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import pandas as pd
+import requests
+
+from services.data_cache import ExcelSnapshotCache
+
+COL_VILLE = 'Ville'
+
+
+def _is_url(path):
+    return path.startswith(('http://', 'https://'))
+
+
+def read_manifest(source, timeout=10):
+    """Liste des classeurs {name, url, sheet}, chemins résolus"""
+    if _is_url(source):
+        response = requests.get(source, timeout=timeout)
+        response.raise_for_status()
+        manifest = response.json()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    shards = manifest['shards'] if isinstance(manifest, dict) else manifest
+    resolved = []
+    for i, shard in enumerate(shards):
+        shard = {'url': shard} if isinstance(shard, str) else dict(shard)
+        url = shard['url']
+        if not _is_url(url) and not os.path.isabs(url):
+            url = urljoin(source, url) if _is_url(source) else os.path.join(os.path.dirname(source), url)
+        sheet = shard.get('sheet')
+        name = shard.get('name') or f"{i:03d}_{os.path.splitext(os.path.basename(url))[0]}"
+        resolved.append({'name': str(name), 'url': url, 'sheet': sheet})
+    names = [s['name'] for s in resolved]
+    if len(set(names)) != len(names):
+        raise ValueError("Noms de classeurs en double dans le manifeste")
+    return resolved
+
+
+def _load_shard(shard, cache_dir, offline, timeout):
+    # Fonction de module : exécutable dans un processus du pool
+    cache = ExcelSnapshotCache(shard['url'], cache_dir=cache_dir, name=shard['name'],
+                               timeout=timeout, offline=offline, sheet=shard['sheet'])
+    df = cache.load()
+    return df, {
+        'name': shard['name'],
+        'url': shard['url'],
+        'sheet': shard['sheet'],
+        'status': cache.last_status,
+        'sha256': cache.read_meta().get('sha256'),
+        'rows': len(df),
+    }
+
+
+def align_schemas(frames):
+    """
+    Mêmes colonnes, dans le même ordre, pour tous les classeurs : ordre du
+    premier classeur, puis colonnes apparues ensuite ; les absentes sont vides.
+    """
+    columns = []
+    for df in frames:
+        columns.extend(c for c in df.columns if c not in columns)
+    return [df.reindex(columns=columns) for df in frames]
+
+
+def concat_by_ville(frames):
+    """Concatène en regroupant les lignes par Ville (ordre d'origine conservé dans chaque ville)"""
+    frames = [df for df in align_schemas(frames) if len(df)]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if COL_VILLE in df.columns:
+        ville = df[COL_VILLE].astype(object).fillna('').astype(str).str.strip()
+        df = df.iloc[ville.argsort(kind='stable')].reset_index(drop=True)
+    return df
+
+
+def load_shards(manifest, cache_dir='data/cache/shards', offline=False, workers=None, processes=False, timeout=10):
+    """
+    DataFrame de tous les classeurs du manifeste (chemin ou URL).
+    Par défaut, pool de threads : téléchargements et lecture des instantanés
+    Parquet libèrent le GIL, et aucun fork du serveur Streamlit (multi-thread).
+    processes=True : pool de processus, à réserver aux scripts hors Streamlit
+    qui re-parsent beaucoup de classeurs Excel (les DataFrames sont alors
+    sérialisés vers le processus parent).
+    df.attrs['shards'] détaille l'état de chaque classeur, df.attrs['version']
+    combine leurs hash.
+    """
+    shards = read_manifest(manifest, timeout=timeout)
+    workers = min(workers or os.cpu_count() or 1, max(len(shards), 1))
+    pool_cls = ProcessPoolExecutor if processes and workers > 1 else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        futures = [pool.submit(_load_shard, shard, cache_dir, offline, timeout) for shard in shards]
+        results = [future.result() for future in futures]
+
+    df = concat_by_ville([frame for frame, _ in results])
+    infos = [info for _, info in results]
+    digest = hashlib.sha256('|'.join(f"{i['name']}:{i['sha256']}" for i in infos).encode('utf-8'))
+    df.attrs['version'] = digest.hexdigest()
+    df.attrs['shards'] = infos
+    return df
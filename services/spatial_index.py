@@ -0,0 +1,183 @@
+# spatial_index.py
+"""
+Index spatial des tronçons et des poches de taudis.
+
+Les coordonnées (latitude / longitude produites par load_data) sont projetées
+sur la sphère unité et rangées dans un KD-tree (scipy) : la corde entre deux
+points est une fonction monotone de la distance haversine, donc les requêtes
+par rayon et des k plus proches voisins sont exactes, en O(log n) par point.
+"""
+import numpy as np
+import pandas as pd
+
+from services.dtypes import degraded_mask
+
+EARTH_RADIUS_M = 6371008.8
+
+COL_VILLE = 'Ville'
+COL_COMMUNE = 'Nom de la Commune'
+COL_TRONCON = 'tronçon de voirie'
+COL_POCHE = 'Nom de la poche du quartier de taudis'
+COL_TAUDIS = 'superficie de la poche du quartier de taudis'
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Distance haversine (mètres), vectorisée"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _unit_xyz(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _chord(radius_m):
+    """Corde sur la sphère unité correspondant à une distance au sol"""
+    return 2 * np.sin(np.minimum(np.asarray(radius_m, dtype=float) / EARTH_RADIUS_M, np.pi) / 2)
+
+
+def _metres(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+class SpatialIndex:
+    def __init__(self, lat, lon, positions=None):
+        """
+        lat / lon : coordonnées des points indexés (les NaN sont ignorés).
+        positions : identifiant renvoyé pour chaque point (par défaut son rang).
+        """
+        from scipy.spatial import cKDTree
+
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        ids = np.arange(len(lat)) if positions is None else np.asarray(positions)
+        self.lat = lat[valid]
+        self.lon = lon[valid]
+        self.positions = ids[valid]
+        self.tree = cKDTree(_unit_xyz(self.lat, self.lon))
+
+    @classmethod
+    def from_frame(cls, df, mask=None):
+        """Index des lignes de df (ou de celles de mask) ; renvoie des positions dans df"""
+        positions = np.arange(len(df)) if mask is None else np.flatnonzero(np.asarray(mask, dtype=bool))
+        lat = df['latitude'].to_numpy(dtype=float)[positions]
+        lon = df['longitude'].to_numpy(dtype=float)[positions]
+        return cls(lat, lon, positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def query_radius(self, lat, lon, radius_m):
+        """
+        Requête groupée : pour chaque point d'interrogation, (positions, distances en m)
+        des points indexés à moins de radius_m, triés par distance.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        if not len(self):
+            return [(self.positions[:0], np.empty(0))] * len(lat)
+        hits = self.tree.query_ball_point(_unit_xyz(lat, lon), _chord(radius_m))
+        results = []
+        for i, idx in enumerate(hits):
+            idx = np.asarray(idx, dtype=np.intp)
+            dist = haversine_m(lat[i], lon[i], self.lat[idx], self.lon[idx])
+            order = np.argsort(dist, kind='stable')
+            results.append((self.positions[idx[order]], dist[order]))
+        return results
+
+    def query_pairs(self, lat, lon, radius_m):
+        """
+        Variante à plat de query_radius pour de gros volumes : tableaux
+        (rang du point d'interrogation, position indexée, distance en m).
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        if not len(self) or not len(lat):
+            return np.empty(0, dtype=np.intp), self.positions[:0], np.empty(0)
+        from scipy.spatial import cKDTree
+        queries = cKDTree(_unit_xyz(lat, lon))
+        # Matrice creuse des paires à distance de corde <= rayon
+        pairs = queries.sparse_distance_matrix(self.tree, float(_chord(radius_m)), output_type='ndarray')
+        query_rank = pairs['i'].astype(np.intp)
+        idx = pairs['j'].astype(np.intp)
+        dist = haversine_m(lat[query_rank], lon[query_rank], self.lat[idx], self.lon[idx])
+        # Tri (point, distance) en un seul argsort : la distance normalisée est < 1
+        order = np.argsort(query_rank + dist / (float(radius_m) + 1.0), kind='stable')
+        return query_rank[order], self.positions[idx[order]], dist[order]
+
+    def query_knn(self, lat, lon, k=5):
+        """
+        k plus proches voisins de chaque point : (positions, distances en m),
+        tableaux (n, k) ; complétés par -1 / inf s'il y a moins de k points.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        if not len(self):
+            return np.full((len(lat), k), -1), np.full((len(lat), k), np.inf)
+        chord, idx = self.tree.query(_unit_xyz(lat, lon), k=k)
+        chord = chord.reshape(len(lat), k)
+        idx = idx.reshape(len(lat), k)
+        missing = idx >= len(self)
+        positions = np.where(missing, -1, self.positions[np.minimum(idx, len(self) - 1)])
+        return positions, np.where(missing, np.inf, _metres(chord))
+
+
+# ---------- Requêtes métier ----------
+def _text(df, column):
+    if column not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    return df[column].astype(object).where(df[column].notna(), None)
+
+
+def slum_pockets(df):
+    """Une ligne par poche de taudis (Ville, Commune, nom) avec ses coordonnées"""
+    named = _text(df, COL_POCHE).astype('string').str.strip()  # les cellules vides restent manquantes (<NA>, pandas 2 et 3)
+    mask = named.fillna('').ne('').to_numpy(dtype=bool) & df['latitude'].notna().to_numpy() & df['longitude'].notna().to_numpy()
+    pockets = pd.DataFrame({
+        'Ville': _text(df, COL_VILLE),
+        'Commune': _text(df, COL_COMMUNE),
+        'poche': named,
+        'superficie': pd.to_numeric(df[COL_TAUDIS], errors='coerce') if COL_TAUDIS in df.columns else np.nan,
+        'latitude': df['latitude'],
+        'longitude': df['longitude'],
+    }, index=df.index)[mask]
+    return pockets.drop_duplicates(['Ville', 'Commune', 'poche']).reset_index(drop=True)
+
+
+def degraded_segments_near_pockets(df, radius_m=200, index=None):
+    """
+    Tronçons dégradés (voir degraded_mask) à moins de radius_m de chaque
+    poche de taudis, pour toute une ville : une ligne par paire, triée par
+    poche puis distance. index : SpatialIndex des tronçons dégradés déjà construit.
+    """
+    if index is None:
+        index = SpatialIndex.from_frame(df, degraded_mask(df))
+    pockets = slum_pockets(df)
+    rank, positions, dist = index.query_pairs(pockets['latitude'], pockets['longitude'], radius_m)
+
+    def repeat(values, rows):
+        # Catégories : pas de copie des libellés pour chaque paire
+        codes, uniques = pd.factorize(values)
+        return pd.Categorical.from_codes(codes[rows], categories=uniques)
+
+    return pd.DataFrame({
+        'Ville': repeat(pockets['Ville'], rank),
+        'Commune': repeat(pockets['Commune'], rank),
+        'poche': repeat(pockets['poche'], rank),
+        'superficie': pockets['superficie'].to_numpy(dtype=float)[rank],
+        'troncon': repeat(_text(df, COL_TRONCON), positions),
+        'position': positions,
+        'distance_m': dist,
+    })
+
+
+def nearest_segments(df, lat, lon, k=5, mask=None):
+    """k tronçons les plus proches de chaque point (lignes de df et distances en m)"""
+    index = SpatialIndex.from_frame(df, mask)
+    positions, dist = index.query_knn(lat, lon, k)
+    return positions, dist